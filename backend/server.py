@@ -1,27 +1,439 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Body, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Body, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi.routing import APIRoute
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Match
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, EmailStr, TypeAdapter, ValidationError, model_validator
+from typing import List, Optional, Dict, Any, Tuple, Union, Callable, Awaitable, AsyncIterator
+import re
+import html
 import uuid
-from datetime import datetime, timedelta
+import math
+import hashlib
+import random
+from array import array
+import time
+import threading
+import functools
+import itertools
+from contextlib import nullcontext
+from contextvars import ContextVar
+from bisect import bisect_left
+import base64
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import json
+import csv
+import io
 import passlib.hash as hash
 import jwt
-from bson import json_util
+from sortedcontainers import SortedList
+from pymongo import ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 
 # Set up root directory and load environment variables
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+# Prometheus text-format metrics, served at /metrics on the backend port (nginx
+# only proxies /api). Recording is a dict lookup and a bucket increment under
+# a lock, so it can sit on every request and every Mongo command. Mongo timings
+# come from pymongo's command monitoring, which runs on Motor's threads.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.environ.get("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+def metric_labels(names: Tuple[str, ...], values: Tuple[Any, ...]) -> str:
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return ",".join(pairs)
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: Dict[Tuple[Any, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[Any, ...], value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            label_text = metric_labels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text}{"," if label_text else ""}le="{bound}"}} {cumulative}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+class Gauge:
+    # Also used for counters; `kind` only changes the TYPE line
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.kind = kind
+        self._values: Dict[Tuple[Any, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[Any, ...] = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, labels: Tuple[Any, ...], value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            label_text = metric_labels(self.labels, labels)
+            lines.append(f"{self.name}{{{label_text}}} {value}" if label_text else f"{self.name} {value}")
+        return lines
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"))
+http_requests_in_flight = Gauge("http_requests_in_flight", "HTTP requests being served")
+mongo_command_duration = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency by collection and command", ("collection", "command"))
+mongo_command_failures = Gauge(
+    "mongo_command_failures_total", "Failed MongoDB commands", ("collection", "command"), kind="counter")
+mongo_pool_connections = Gauge("mongo_pool_connections", "Open pooled connections per server", ("address",))
+mongo_pool_checked_out = Gauge("mongo_pool_checked_out", "Pooled connections in use per server", ("address",))
+mongo_pool_max_size = Gauge("mongo_pool_max_size", "Connection pool size limit per server")
+mongo_pool_checkout_failures = Gauge(
+    "mongo_pool_checkout_failures_total", "Failed connection checkouts per server and reason", ("address", "reason"), kind="counter")
+event_loop_lag = Histogram(
+    "event_loop_lag_seconds", "Delay of a periodic timer on the event loop beyond its schedule", ())
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], Tuple[str, Optional["RequestTrace"], Optional[int], float]] = {}
+
+    def started(self, event):
+        # getMore names the cursor id in its first field, not the collection
+        target = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        trace = current_trace.get()
+        self._pending[(event.connection_id, event.request_id)] = (
+            target if isinstance(target, str) else "",
+            trace,
+            current_span.get() if trace is not None else None,
+            time.perf_counter() if trace is not None else 0.0,
+        )
+
+    def finished(self, event, failed: bool):
+        collection, trace, parent, started = self._pending.pop((event.connection_id, event.request_id), ("", None, None, 0.0))
+        mongo_command_duration.observe((collection, event.command_name), event.duration_micros / 1e6)
+        if failed:
+            mongo_command_failures.inc((collection, event.command_name))
+        if trace is not None:
+            span = trace.add("db", started, parent, collection=collection, command=event.command_name)
+            span["duration_ms"] = round(event.duration_micros / 1000, 3)
+            if failed:
+                span["error"] = str(event.failure.get("errmsg", ""))
+
+    def succeeded(self, event):
+        self.finished(event, failed=False)
+
+    def failed(self, event):
+        self.finished(event, failed=True)
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        mongo_pool_connections.set((f"{event.address[0]}:{event.address[1]}",), 0)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc((f"{event.address[0]}:{event.address[1]}",))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_connections.inc((f"{event.address[0]}:{event.address[1]}",), -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures.inc((f"{event.address[0]}:{event.address[1]}", event.reason))
+
+    def connection_checked_out(self, event):
+        mongo_pool_checked_out.inc((f"{event.address[0]}:{event.address[1]}",))
+
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.inc((f"{event.address[0]}:{event.address[1]}",), -1)
+
+class MetricsMiddleware:
+    # Plain ASGI rather than @app.middleware, which costs far more per request.
+    # The route template is read after routing, so /islands/{island_id} is one
+    # series however many islands there are.
+    # Only touched on the event loop, so a plain int needs no lock
+    in_flight = 0
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        MetricsMiddleware.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            MetricsMiddleware.in_flight -= 1
+            route = scope.get("route")
+            http_request_duration.observe(
+                (scope["method"], route.path if route is not None else "unmatched", status_code),
+                time.perf_counter() - started,
+            )
+
+class EventLoopLagMonitor:
+    # A sleep that wakes late means something held the loop (a sync call, a
+    # big serialization) and every request waiting on it was delayed as long
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + EVENT_LOOP_LAG_INTERVAL_SECONDS
+            await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+            event_loop_lag.observe((), max(0.0, loop.time() - scheduled))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+event_loop_monitor = EventLoopLagMonitor()
+
+def render_metrics() -> str:
+    http_requests_in_flight.set((), MetricsMiddleware.in_flight)
+    lines = []
+    for metric in (http_request_duration, http_requests_in_flight, mongo_command_duration, mongo_command_failures,
+                   mongo_pool_connections, mongo_pool_checked_out, mongo_pool_max_size,
+                   mongo_pool_checkout_failures, event_loop_lag):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Request tracing
+# Opt-in with REQUEST_TRACING=true. Each request gets a span tree (auth, every
+# Mongo command, handler, serialization) kept in a context variable; Motor
+# copies the context into its executor threads, so the command listener can
+# attach spans to the request that issued them. Totals per span name go out in
+# a Server-Timing header, and requests slower than SLOW_REQUEST_MS are written
+# with their full tree as one JSON object per line, to SLOW_REQUEST_LOG when
+# it is set and to stderr otherwise.
+REQUEST_TRACING = os.environ.get("REQUEST_TRACING", "false").lower() == "true"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_LOG = os.environ.get("SLOW_REQUEST_LOG")
+
+class RequestTrace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.handler_finished: Optional[float] = None
+        self._ids = itertools.count()
+
+    def add(self, name: str, started: float, parent: Optional[int], **attrs) -> Dict[str, Any]:
+        # Called from Motor's threads as well as the loop; count() and
+        # list.append are atomic, so no lock is needed
+        span = {"id": next(self._ids), "parent": parent, "name": name,
+                "start_ms": round((started - self.started) * 1000, 3), "duration_ms": None, **attrs}
+        self.spans.append(span)
+        return span
+
+    def server_timing(self) -> str:
+        totals: Dict[str, List[float]] = {}
+        for span in self.spans:
+            if span["duration_ms"] is not None:
+                total = totals.setdefault(span["name"], [0.0, 0])
+                total[0] += span["duration_ms"]
+                total[1] += 1
+        entries = [
+            f'{name};dur={duration:.2f}' + (f';desc="{count} calls"' if count > 1 else "")
+            for name, (duration, count) in totals.items()
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+    def tree(self) -> List[Dict[str, Any]]:
+        children: Dict[Optional[int], list] = {}
+        for span in sorted(self.spans, key=lambda span: span["start_ms"]):
+            node = {key: value for key, value in span.items() if key not in ("id", "parent")}
+            node["children"] = children.setdefault(span["id"], [])
+            children.setdefault(span["parent"], []).append(node)
+        return children.get(None, [])
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+current_span: ContextVar[Optional[int]] = ContextVar("current_span", default=None)
+
+class TraceSpan:
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.span = self.trace.add(self.name, self.started, current_span.get())
+        self.token = current_span.set(self.span["id"])
+        return self.span
+
+    def __exit__(self, *exc_info):
+        current_span.reset(self.token)
+        self.span["duration_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+
+NO_SPAN = nullcontext()
+
+def trace_span(name: str):
+    trace = current_trace.get()
+    return NO_SPAN if trace is None else TraceSpan(trace, name)
+
+class TracedRoute(APIRoute):
+    # FastAPI solves dependencies (auth has its own span), awaits the endpoint,
+    # then validates and encodes the return value against response_model. The
+    # endpoint is wrapped to mark where that last step starts, so it can be
+    # reported as "serialize". Routes returning a Response have nothing to
+    # encode and span their own serialization in json_response.
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, self.traced_endpoint(endpoint), **kwargs)
+
+    @staticmethod
+    def traced_endpoint(endpoint: Callable) -> Callable:
+        # include_router rebuilds each route from its (already wrapped) endpoint
+        if getattr(endpoint, "traced", False):
+            return endpoint
+        
+        @functools.wraps(endpoint)
+        async def traced(*args, **kwargs):
+            trace = current_trace.get()
+            if trace is None:
+                return await endpoint(*args, **kwargs)
+            with TraceSpan(trace, "handler"):
+                result = await endpoint(*args, **kwargs)
+            if not isinstance(result, Response):
+                trace.handler_finished = time.perf_counter()
+            return result
+        
+        traced.traced = True
+        return traced
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        
+        async def traced_handler(request: Request):
+            response = await handler(request)
+            trace = current_trace.get()
+            if trace is not None and trace.handler_finished is not None:
+                span = trace.add("serialize", trace.handler_finished, current_span.get())
+                span["duration_ms"] = round((time.perf_counter() - trace.handler_finished) * 1000, 3)
+            return response
+        
+        return traced_handler
+
+slow_request_logger = logging.getLogger("slow_requests")
+slow_request_logger.propagate = False
+slow_request_logger.setLevel(logging.INFO)
+if REQUEST_TRACING:
+    slow_request_handler = logging.FileHandler(SLOW_REQUEST_LOG) if SLOW_REQUEST_LOG else logging.StreamHandler()
+    slow_request_handler.setFormatter(logging.Formatter("%(message)s"))
+    slow_request_logger.addHandler(slow_request_handler)
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        status_code = 500
+        
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [
+                    *message.get("headers", []), (b"server-timing", trace.server_timing().encode())]}
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_trace.reset(token)
+            duration_ms = (time.perf_counter() - trace.started) * 1000
+            if duration_ms >= SLOW_REQUEST_MS:
+                route = scope.get("route")
+                slow_request_logger.info(json.dumps({
+                    "time": datetime.utcnow().isoformat(),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": route.path if route is not None else None,
+                    "status": status_code,
+                    "duration_ms": round(duration_ms, 3),
+                    "db_round_trips": sum(span["name"] == "db" for span in trace.spans),
+                    "spans": trace.tree(),
+                }))
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics(), MongoPoolMetrics()])
+mongo_pool_max_size.set((), client.options.pool_options.max_pool_size)
 db = client[os.environ['DB_NAME']]
 
 # JWT Settings
@@ -33,18 +445,87 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
 app = FastAPI()
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=TracedRoute)
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
+# Same scheme for routes where signing in is optional
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login", auto_error=False)
+
+# Authenticated users are cached per worker so auth does not cost a Mongo
+# round-trip on every request
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.environ.get("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+# Ad index reload interval, a backstop: admin changes on any worker bump the
+# shared ads version, which other workers follow on their next read
+AD_INDEX_REFRESH_SECONDS = float(os.environ.get("AD_INDEX_REFRESH_SECONDS", "60"))
+
+# Ad impressions and clicks are buffered in memory and flushed as aggregated
+# counters. The buffer is a ring: when full, the oldest events are dropped.
+# AD_EVENTS_SHUTDOWN_POLICY is "flush" (write what is buffered) or "drop".
+AD_EVENTS_BUFFER_SIZE = int(os.environ.get("AD_EVENTS_BUFFER_SIZE", "100000"))
+AD_EVENTS_FLUSH_SECONDS = float(os.environ.get("AD_EVENTS_FLUSH_SECONDS", "5"))
+AD_EVENTS_BUCKET_SECONDS = int(os.environ.get("AD_EVENTS_BUCKET_SECONDS", "300"))
+AD_EVENTS_SHUTDOWN_POLICY = os.environ.get("AD_EVENTS_SHUTDOWN_POLICY", "flush")
+
+# Ad rotation: frequency caps count serves per visitor over a sliding window
+# of roughly this length, approximated by two alternating count-min sketches
+AD_FREQUENCY_WINDOW_SECONDS = float(os.environ.get("AD_FREQUENCY_WINDOW_SECONDS", "86400"))
+
+# How often each worker re-reads the shared collection versions that back
+# ETags, i.e. how long a write on another worker can go unnoticed
+HTTP_CACHE_VERSION_REFRESH_SECONDS = float(os.environ.get("HTTP_CACHE_VERSION_REFRESH_SECONDS", "1"))
+
+# Admin analytics results are cached briefly per worker
+ANALYTICS_CACHE_TTL_SECONDS = float(os.environ.get("ANALYTICS_CACHE_TTL_SECONDS", "60"))
+
+# bcrypt runs on a dedicated thread pool (it releases the GIL) so hashing
+# never blocks the event loop; logins beyond the queue limit get a 503
+PASSWORD_HASH_CONCURRENCY = int(os.environ.get("PASSWORD_HASH_CONCURRENCY", "4"))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", "256"))
+
+# Leaderboards are updated in place on each worker's own visit writes and
+# pick up the other workers' by re-reading the users whose rollups changed
+# since the last sync. The sync window is widened by this much so writes that
+# commit slightly out of timestamp order are not missed.
+LEADERBOARD_SYNC_OVERLAP_SECONDS = float(os.environ.get("LEADERBOARD_SYNC_OVERLAP_SECONDS", "5"))
+
+# Follow the islands change stream so catalog writes made by other workers are
+# picked up (requires a replica set)
+ISLAND_CATALOG_WATCH = os.environ.get("ISLAND_CATALOG_WATCH", "false").lower() == "true"
 
 # Define MongoDB collection names
 USERS_COLLECTION = "users"
 ISLANDS_COLLECTION = "islands"
 VISITS_COLLECTION = "visits"
 BADGES_COLLECTION = "badges"
+BADGE_PROGRESS_COLLECTION = "badge_progress"  # per (badge, user) counter and distinct keys seen
 BLOG_POSTS_COLLECTION = "blog_posts"
 ADS_COLLECTION = "ads"
+VERSIONS_COLLECTION = "collection_versions"  # write counters behind HTTP ETags
+AD_STATS_COLLECTION = "ad_stats"  # impressions and clicks per ad per time bucket
+JOBS_COLLECTION = "jobs"  # one document per claimed one-off maintenance job
+
+# Visit rollups, maintained incrementally on every visit write
+ROLLUP_ISLAND_DAILY_COLLECTION = "rollup_island_daily"  # visits per island per day
+ROLLUP_ATOLL_DAILY_COLLECTION = "rollup_atoll_daily"  # visits per atoll per day
+ROLLUP_USER_ISLANDS_COLLECTION = "rollup_user_islands"  # visits per (user, island)
+ROLLUP_USER_ATOLLS_COLLECTION = "rollup_user_atolls"  # distinct islands per (user, atoll)
+ROLLUP_ISLANDS_COLLECTION = "rollup_islands"  # visits and distinct visitors per island
+ROLLUP_USERS_COLLECTION = "rollup_users"  # visits, distinct islands and atolls per user
+ROLLUP_COLLECTIONS = [
+    ROLLUP_ISLAND_DAILY_COLLECTION,
+    ROLLUP_ATOLL_DAILY_COLLECTION,
+    ROLLUP_USER_ISLANDS_COLLECTION,
+    ROLLUP_USER_ATOLLS_COLLECTION,
+    ROLLUP_ISLANDS_COLLECTION,
+    ROLLUP_USERS_COLLECTION,
+]
+
+# GeoJSON point for the islands 2dsphere index (GeoJSON order is lng, lat)
+def geo_point(lat: float, lng: float) -> Dict[str, Any]:
+    return {"type": "Point", "coordinates": [lng, lat]}
 
 # Define Models
 class Island(BaseModel):
@@ -61,8 +542,20 @@ class Island(BaseModel):
     featured_image: Optional[str] = None
     featured_order: Optional[int] = None
     photos: List[Dict[str, str]] = []  # [{url: string, caption: string}]
+    # GeoJSON Point, always derived from lat/lng; stored for the 2dsphere index
+    # but left out of API responses, which already carry lat/lng
+    location: Optional[Dict[str, Any]] = Field(default=None, exclude=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    @model_validator(mode="after")
+    def set_location(self):
+        self.location = geo_point(self.lat, self.lng)
+        return self
+
+    def document(self) -> Dict[str, Any]:
+        # The stored form, with the location the API models leave out
+        return {**self.model_dump(), "location": self.location}
+
 class IslandCreate(BaseModel):
     name: str
     atoll: str
@@ -77,6 +570,37 @@ class IslandCreate(BaseModel):
     featured_order: Optional[int] = None
     photos: List[Dict[str, str]] = []  # [{url: string, caption: string}]
 
+class IslandImportError(BaseModel):
+    line: int
+    error: str
+
+class IslandImportResult(BaseModel):
+    processed: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    errors: List[IslandImportError] = []
+    errors_truncated: bool = False
+
+class NearbyIsland(Island):
+    distance_km: float
+
+class VisitedIsland(Island):
+    first_visit: datetime
+    last_visit: datetime
+    visit_count: int
+
+class IslandCluster(BaseModel):
+    lat: float
+    lng: float
+    count: int
+    island_ids: List[str]
+
+class IslandViewport(BaseModel):
+    islands: List[Island]
+    clusters: List[IslandCluster]
+
 class UserBase(BaseModel):
     email: EmailStr
     username: str
@@ -101,6 +625,7 @@ class Visit(BaseModel):
     visit_date: datetime
     notes: Optional[str] = None
     photos: List[str] = []
+    client_id: Optional[str] = None  # idempotency key from offline clients
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class VisitCreate(BaseModel):
@@ -109,6 +634,27 @@ class VisitCreate(BaseModel):
     notes: Optional[str] = None
     photos: List[str] = []
 
+VISIT_BATCH_MAX_SIZE = 500
+
+class VisitBatchItem(VisitCreate):
+    client_id: str = Field(min_length=1, max_length=100)
+
+class VisitBatch(BaseModel):
+    visits: List[VisitBatchItem] = Field(max_length=VISIT_BATCH_MAX_SIZE)
+
+class VisitBatchItemResult(BaseModel):
+    client_id: str
+    status: str  # "created", "duplicate" or "error"
+    visit: Optional[Visit] = None
+    error: Optional[str] = None
+
+class VisitBatchResult(BaseModel):
+    created: int
+    duplicates: int
+    failed: int
+    results: List[VisitBatchItemResult]
+    badges_awarded: List[str] = []
+
 class Badge(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -116,6 +662,52 @@ class Badge(BaseModel):
     criteria: Dict[str, Any]
     icon: str
 
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: str
+    username: Optional[str] = None
+    score: int
+
+class Leaderboard(BaseModel):
+    metric: str
+    atoll: Optional[str] = None
+    participants: int
+    entries: List[LeaderboardEntry]
+
+class LeaderboardRank(BaseModel):
+    metric: str
+    atoll: Optional[str] = None
+    participants: int
+    rank: Optional[int] = None  # None until the user has a score on this board
+    score: int
+
+class BadgeCriteria(BaseModel):
+    # What is counted per user: all "visits", distinct "islands", distinct
+    # "atolls", or "atoll_coverage", the share (0-1] of `atoll`'s islands
+    metric: str = Field(pattern="^(visits|islands|atolls|atoll_coverage)$")
+    min: float = Field(gt=0)
+    type: Optional[str] = None  # only islands of this type count
+    atoll: Optional[str] = None  # only islands in this atoll count
+    start: Optional[datetime] = None  # only visits dated in [start, end) count
+    end: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_coverage(self):
+        if self.metric == "atoll_coverage" and (self.atoll is None or self.min > 1):
+            raise ValueError("atoll_coverage needs an atoll and a min between 0 and 1")
+        return self
+
+class BadgeCreate(BaseModel):
+    name: str
+    description: str
+    criteria: BadgeCriteria
+    icon: str
+
+class BadgeProgress(Badge):
+    count: int
+    target: int
+    earned: bool
+
 class BlogPost(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str
@@ -144,6 +736,32 @@ class BlogPostCreate(BaseModel):
     featured_order: Optional[int] = None
     published_date: Optional[datetime] = None
 
+# Listing shape for GET /blog?view=summary; everything except the body
+class BlogPostSummary(BaseModel):
+    id: str
+    slug: str
+    title: str
+    excerpt: Optional[str] = None
+    featured_image: Optional[str] = None
+    tags: List[str] = []
+    is_published: bool = True
+    is_featured: bool = False
+    published_date: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
+
+class BlogSearchResult(BaseModel):
+    id: str
+    slug: str
+    title: str
+    excerpt: Optional[str] = None
+    featured_image: Optional[str] = None
+    tags: List[str] = []
+    published_date: Optional[datetime] = None
+    score: float
+    title_highlight: str  # HTML-escaped, matches wrapped in <mark>
+    snippet: str  # HTML-escaped content excerpt, matches wrapped in <mark>
+
 class Ad(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -154,6 +772,9 @@ class Ad(BaseModel):
     alt_text: Optional[str] = None
     size: str  # "728x90", "300x250", "160x600", etc.
     is_active: bool = True
+    weight: int = Field(1, ge=1)  # relative share in rotation
+    frequency_cap: Optional[int] = Field(None, ge=1)  # max serves per visitor per frequency window
+    daily_budget: Optional[int] = Field(None, ge=1)  # serves per day, paced evenly across the day
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -168,82 +789,1811 @@ class AdCreate(BaseModel):
     alt_text: Optional[str] = None
     size: str
     is_active: bool = True
+    weight: int = Field(1, ge=1)  # relative share in rotation
+    frequency_cap: Optional[int] = Field(None, ge=1)  # max serves per visitor per frequency window
+    daily_budget: Optional[int] = Field(None, ge=1)  # serves per day, paced evenly across the day
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
 
-class Token(BaseModel):
-    access_token: str
-    token_type: str
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+
+class TokenData(BaseModel):
+    user_id: Optional[str] = None
+
+# Helper Functions
+island_list_adapter = TypeAdapter(List[Island])
+blog_post_adapter = TypeAdapter(BlogPost)
+blog_post_list_adapter = TypeAdapter(List[BlogPost])
+blog_summary_list_adapter = TypeAdapter(List[BlogPostSummary])
+ad_list_adapter = TypeAdapter(List[Ad])
+
+def json_response(adapter: TypeAdapter, value: Any, response: Optional[Response] = None) -> Response:
+    # Serializes already-validated models straight to bytes in pydantic-core,
+    # skipping FastAPI's response_model re-validation and jsonable_encoder pass.
+    # Headers set on the injected response (X-Total-Count etc.) are carried over.
+    headers = dict(response.headers) if response is not None else None
+    with trace_span("serialize"):
+        content = adapter.dump_json(value)
+    return Response(content=content, media_type="application/json", headers=headers)
+
+# Opaque keyset pagination cursors: the sort key of the last item returned
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode()
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+# Bounded LRU cache whose entries expire `ttl` seconds after being stored
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def sync(self, version: int):
+        # Drops every entry once the shared version it was filled under moves
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
+
+# Authenticated users keyed by user id; admin changes to a user bump the users
+# version, which empties this cache on every worker. visits_count and badges
+# move with every visit, so routes that serve them read them fresh.
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Admin analytics results keyed by (report, parameters)
+analytics_cache = TTLCache(256, ANALYTICS_CACHE_TTL_SECONDS)
+
+def get_password_hash(password: str) -> str:
+    return hash.bcrypt.hash(password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return hash.bcrypt.verify(plain_password, hashed_password)
+
+# Bounded executor for bcrypt. The semaphore caps concurrent hashes at the
+# pool size so queueing happens on the event loop where it can be measured.
+class PasswordHasher:
+    def __init__(self, concurrency: int, max_queue: int):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    async def _run(self, func, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, please retry",
+                headers={"Retry-After": "1"},
+            )
+        enqueued = time.perf_counter()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+        started = time.perf_counter()
+        wait = started - enqueued
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.running += 1
+        try:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="bcrypt")
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.total_run += time.perf_counter() - started
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": self.total_wait / self.completed * 1000 if self.completed else None,
+            "max_wait_ms": self.max_wait * 1000,
+            "avg_run_ms": self.total_run / self.completed * 1000 if self.completed else None,
+        }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_MAX_QUEUE)
+
+async def get_user_by_email(email: str):
+    user = await db[USERS_COLLECTION].find_one({"email": email})
+    if user:
+        return UserInDB(**user)
+    return None
+
+async def get_user_by_id(user_id: str):
+    user = await db[USERS_COLLECTION].find_one({"id": user_id})
+    if user:
+        return UserInDB(**user)
+    return None
+
+async def authenticate_user(email: str, password: str):
+    user = await get_user_by_email(email)
+    if not user:
+        return False
+    if not await password_hasher.verify(password, user.hashed_password):
+        return False
+    return user
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    to_encode = data.copy()
+    if expires_delta:
+        expire = datetime.utcnow() + expires_delta
+    else:
+        expire = datetime.utcnow() + timedelta(minutes=15)
+    to_encode.update({"exp": expire})
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return encoded_jwt
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    with trace_span("auth"):
+        try:
+            with trace_span("jwt"):
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+            token_data = TokenData(user_id=user_id)
+        except jwt.PyJWTError:
+            raise credentials_exception
+        principal_cache.sync(collection_versions.get(USERS_COLLECTION))
+        user = principal_cache.get(token_data.user_id)
+        if user is None:
+            user = await get_user_by_id(token_data.user_id)
+            if user is None:
+                raise credentials_exception
+            principal_cache.set(user.id, user)
+        return user
+
+USER_COUNTER_FIELDS = {"_id": 0, "visits_count": 1, "badges": 1}
+
+async def with_fresh_counters(user: User) -> User:
+    doc = await db[USERS_COLLECTION].find_one({"id": user.id}, USER_COUNTER_FIELDS)
+    return user.model_copy(update=doc) if doc else user
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[User]:
+    if not token:
+        return None
+    try:
+        return await get_current_user(token)
+    except HTTPException:
+        return None
+
+async def get_current_admin(current_user: User = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return current_user
+
+# Shared collection versions
+# Writes bump a per-collection counter in Mongo; workers re-read the counters
+# every HTTP_CACHE_VERSION_REFRESH_SECONDS so conditional GETs are answered
+# from memory and stay consistent across workers.
+class CollectionVersions:
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def load(self):
+        async for doc in db[VERSIONS_COLLECTION].find():
+            self._versions[doc["_id"]] = max(doc["version"], self._versions.get(doc["_id"], 0))
+
+    async def bump(self, collection: str) -> int:
+        doc = await db[VERSIONS_COLLECTION].find_one_and_update(
+            {"_id": collection},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._versions[collection] = max(doc["version"], self._versions.get(collection, 0))
+        return doc["version"]
+
+    def get(self, collection: str) -> int:
+        return self._versions.get(collection, 0)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.load()
+            except PyMongoError as e:
+                logger.warning(f"Could not refresh collection versions: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+collection_versions = CollectionVersions(HTTP_CACHE_VERSION_REFRESH_SECONDS)
+
+# Rendered responses
+# Caches the final JSON bytes of hot public endpoints. Each entry remembers the
+# shared version it was rendered at, so a bump on any worker invalidates it,
+# and concurrent misses for the same key share a single render.
+FEATURED_ISLANDS_VERSION = "featured_islands"
+FEATURED_ARTICLES_VERSION = "featured_articles"
+
+class RenderedCache:
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, bytes]] = {}
+        # Resolves to the body, or to None if its render was cancelled
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get(self, key: str, render: Callable[[], Awaitable[bytes]]) -> bytes:
+        version = collection_versions.get(key)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            body = await asyncio.shield(inflight)
+            if body is not None:
+                return body
+            # The request that owned the render was cancelled; take over
+            return await self.get(key, render)
+        
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            body = await render()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                # Not the waiters' failure: None tells them to render themselves
+                future.set_result(None)
+            else:
+                future.set_exception(e)
+                future.exception()  # waiters get it; don't warn if there are none
+            raise
+        finally:
+            del self._inflight[key]
+        # Stored under the version read before rendering, so a write that
+        # lands mid-render forces the next request to render again
+        self._entries[key] = (version, body)
+        future.set_result(body)
+        return body
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+rendered_cache = RenderedCache()
+
+# In-process island catalog
+# The catalog is small and rarely written, so island reads are served from
+# memory. `version` is bumped on every change so callers can detect staleness.
+# Writes on other workers show up as a bumped shared islands version, and the
+# catalog reloads before serving anything older than the ETag it goes out under.
+def island_search_fields(island: Island) -> List[str]:
+    return [island.name.lower(), island.atoll.lower()] + [tag.lower() for tag in island.tags]
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class IslandCatalog:
+    def __init__(self):
+        self._islands: Dict[str, Island] = {}
+        # Inverted indexes: field value (or search trigram) -> island ids
+        self._by_type: Dict[str, set] = {}
+        self._by_atoll: Dict[str, set] = {}
+        self._by_tag: Dict[str, set] = {}
+        self._by_trigram: Dict[str, set] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+        self._reload_lock = asyncio.Lock()
+        self.loaded = False
+        self.watching = False
+        self.version = 0
+        # Shared islands version the current contents are known to include
+        self.shared_version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _postings(self, island: Island):
+        yield self._by_type, [island.type]
+        yield self._by_atoll, [island.atoll]
+        yield self._by_tag, island.tags
+        yield self._by_trigram, set().union(*map(trigrams, island_search_fields(island)))
+
+    def _index(self, island: Island):
+        for index, keys in self._postings(island):
+            for key in keys:
+                index.setdefault(key, set()).add(island.id)
+
+    def _unindex(self, island: Island):
+        for index, keys in self._postings(island):
+            for key in keys:
+                ids = index.get(key)
+                if ids is not None:
+                    ids.discard(island.id)
+                    if not ids:
+                        del index[key]
+
+    async def load(self):
+        # Read before the scan, so a write that lands during it forces another load
+        shared_version = collection_versions.get(ISLANDS_COLLECTION)
+        islands = {}
+        async for doc in db[ISLANDS_COLLECTION].find({}, {"_id": 0}):
+            island = Island(**doc)
+            islands[island.id] = island
+        self._islands = islands
+        self._by_type, self._by_atoll, self._by_tag, self._by_trigram = {}, {}, {}, {}
+        for island in islands.values():
+            self._index(island)
+        self.loaded = True
+        self.shared_version = shared_version
+        self.version += 1
+        logger.info(f"Island catalog loaded {len(islands)} islands (version {self.version})")
+
+    def _stale(self) -> bool:
+        return not self.loaded or self.shared_version != collection_versions.get(ISLANDS_COLLECTION)
+
+    async def refresh(self) -> bool:
+        # Returns True if the catalog had to be (re)loaded
+        if not self._stale():
+            return False
+        async with self._reload_lock:
+            if self._stale():
+                await self.load()
+                return True
+        return False
+
+    async def changed(self):
+        # Publishes a local put()/remove() to the other workers. If it was the
+        # only write since our last load, the catalog is already current.
+        version = await collection_versions.bump(ISLANDS_COLLECTION)
+        if self.shared_version == version - 1 and not self._reload_lock.locked():
+            self.shared_version = version
+
+    def put(self, island: Island):
+        previous = self._islands.get(island.id)
+        if previous is not None:
+            self._unindex(previous)
+        self._islands[island.id] = island
+        self._index(island)
+        self.version += 1
+
+    def remove(self, island_id: str):
+        island = self._islands.pop(island_id, None)
+        if island is not None:
+            self._unindex(island)
+            self.version += 1
+
+    async def all(self) -> List[Island]:
+        if await self.refresh():
+            self.misses += 1
+        else:
+            self.hits += 1
+        return list(self._islands.values())
+
+    async def get(self, island_id: str) -> Optional[Island]:
+        await self.refresh()
+        if self.loaded:
+            island = self._islands.get(island_id)
+            # Without a change stream another worker may have created the
+            # island, so unknown ids still fall through to Mongo
+            if island is not None or self.watching:
+                self.hits += 1
+                return island
+        self.misses += 1
+        doc = await db[ISLANDS_COLLECTION].find_one({"id": island_id}, {"_id": 0})
+        if not doc:
+            return None
+        island = Island(**doc)
+        if self.loaded:
+            self.put(island)
+        return island
+
+    def atoll_size(self, atoll: str) -> int:
+        return len(self._by_atoll.get(atoll, ()))
+
+    async def get_many(self, island_ids: List[str]) -> Dict[str, Island]:
+        # Catalog hits first, then a single $in for anything it doesn't know
+        await self.refresh()
+        found: Dict[str, Island] = {}
+        missing = []
+        for island_id in island_ids:
+            island = self._islands.get(island_id) if self.loaded else None
+            if island is not None:
+                found[island_id] = island
+            else:
+                missing.append(island_id)
+        self.hits += len(found)
+        if missing and not self.watching:
+            self.misses += 1
+            async for doc in db[ISLANDS_COLLECTION].find({"id": {"$in": missing}}, {"_id": 0}):
+                island = Island(**doc)
+                found[island.id] = island
+                if self.loaded:
+                    self.put(island)
+        return found
+
+    async def query(
+        self,
+        type: Optional[str] = None,
+        atoll: Optional[str] = None,
+        tag: Optional[str] = None,
+        q: Optional[str] = None,
+    ) -> List[Island]:
+        islands = await self.all()
+        needle = q.strip().lower() if q else ""
+        postings = []
+        if type:
+            postings.append(self._by_type.get(type, set()))
+        if atoll:
+            postings.append(self._by_atoll.get(atoll, set()))
+        if tag:
+            postings.append(self._by_tag.get(tag, set()))
+        # Substring search: every trigram of the needle must occur in the
+        # island, then the candidates are verified against the real text
+        postings.extend(self._by_trigram.get(gram, set()) for gram in trigrams(needle))
+        if postings:
+            ids = set.intersection(*sorted(postings, key=len))
+            islands = [self._islands[island_id] for island_id in ids]
+        if needle:
+            islands = [
+                island for island in islands
+                if any(needle in field for field in island_search_fields(island))
+            ]
+        return islands
+
+    def atolls(self) -> List[Dict[str, Any]]:
+        return [
+            {"atoll": atoll, "count": len(ids)}
+            for atoll, ids in sorted(self._by_atoll.items())
+        ]
+
+    def start_watching(self):
+        if self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop_watching(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch(self):
+        try:
+            async with db[ISLANDS_COLLECTION].watch(full_document="updateLookup") as stream:
+                self.watching = True
+                # Anything written between load() and opening the stream
+                await self.load()
+                async for change in stream:
+                    document = change.get("fullDocument")
+                    if change["operationType"] in ("insert", "update", "replace") and document:
+                        document.pop("_id", None)
+                        self.put(Island(**document))
+                    else:
+                        # Deletes only carry the Mongo _id, so resync
+                        await self.load()
+        except PyMongoError as e:
+            logger.warning(f"Island change stream unavailable, catalog is per-worker: {e}")
+        finally:
+            self.watching = False
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._islands),
+            "version": self.version,
+            "loaded": self.loaded,
+            "watching": self.watching,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
+
+island_catalog = IslandCatalog()
+
+# Visit rollups
+# Analytics and rankings read these small pre-aggregated documents instead of
+# scanning visits. apply_visit_rollups() keeps them current per visit write
+# (delta=-1 undoes a visit); rebuild_rollups() recomputes them from visits.
+# `suffix` points the writes at the side collections a rebuild fills.
+def visit_day(visit_date: datetime) -> str:
+    if visit_date.tzinfo is not None:
+        visit_date = visit_date.astimezone(timezone.utc)
+    return visit_date.strftime("%Y-%m-%d")
+
+async def increment_pair(collection: str, pair_id: str, field: str, delta: int, identity: Dict[str, str]) -> int:
+    # Returns the counter after the increment; a pair reaching zero is removed
+    pair = await db[collection].find_one_and_update(
+        {"_id": pair_id},
+        {"$inc": {field: delta}, "$setOnInsert": identity},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if pair[field] <= 0:
+        await db[collection].delete_one({"_id": pair_id, field: {"$lte": 0}})
+    return pair[field]
+
+async def apply_visit_rollups(visit: Visit, island: Island, delta: int = 1, suffix: str = ""):
+    day = visit_day(visit.visit_date)
+    _, _, pair_visits = await asyncio.gather(
+        db[ROLLUP_ISLAND_DAILY_COLLECTION + suffix].update_one(
+            {"_id": f"{island.id}:{day}"},
+            {"$inc": {"visits": delta}, "$setOnInsert": {"island_id": island.id, "atoll": island.atoll, "date": day}},
+            upsert=True,
+        ),
+        db[ROLLUP_ATOLL_DAILY_COLLECTION + suffix].update_one(
+            {"_id": f"{island.atoll}:{day}"},
+            {"$inc": {"visits": delta}, "$setOnInsert": {"atoll": island.atoll, "date": day}},
+            upsert=True,
+        ),
+        increment_pair(
+            ROLLUP_USER_ISLANDS_COLLECTION + suffix, f"{visit.user_id}:{island.id}", "visits", delta,
+            {"user_id": visit.user_id, "island_id": island.id, "atoll": island.atoll},
+        ),
+    )
+    
+    # Distinct counts only move when a (user, island) pair appears or vanishes
+    island_delta = atoll_delta = 0
+    if delta > 0 and pair_visits == delta:
+        island_delta = 1
+    elif delta < 0 and pair_visits <= 0:
+        island_delta = -1
+    if island_delta:
+        atoll_islands = await increment_pair(
+            ROLLUP_USER_ATOLLS_COLLECTION + suffix, f"{visit.user_id}:{island.atoll}", "islands", island_delta,
+            {"user_id": visit.user_id, "atoll": island.atoll},
+        )
+        if (island_delta > 0 and atoll_islands == 1) or (island_delta < 0 and atoll_islands <= 0):
+            atoll_delta = island_delta
+    
+    await asyncio.gather(
+        db[ROLLUP_ISLANDS_COLLECTION + suffix].update_one(
+            {"_id": island.id},
+            {"$inc": {"visits": delta, "visitors": island_delta}},
+            upsert=True,
+        ),
+        db[ROLLUP_USERS_COLLECTION + suffix].update_one(
+            {"_id": visit.user_id},
+            {"$inc": {"visits": delta, "islands": island_delta, "atolls": atoll_delta},
+             "$currentDate": {"updated_at": True}},
+            upsert=True,
+        ),
+    )
+    if suffix:
+        return
+    leaderboards.apply(visit.user_id, island.atoll, visits=delta, islands=island_delta, atolls=atoll_delta)
+    # After the rollup write, so other workers that see the bump also see it
+    await leaderboards.changed()
+
+async def apply_user_visit_rollups(user_id: str, visits: List[Tuple[Visit, Island]]):
+    # Batch form of apply_visit_rollups for new visits by one user: the same
+    # counters, but one write per distinct key instead of per visit
+    island_daily: Counter = Counter()
+    atoll_daily: Counter = Counter()
+    pairs: Counter = Counter()
+    islands: Dict[str, Island] = {}
+    for visit, island in visits:
+        day = visit_day(visit.visit_date)
+        island_daily[(island.id, day)] += 1
+        atoll_daily[(island.atoll, day)] += 1
+        pairs[island.id] += 1
+        islands[island.id] = island
+    
+    await asyncio.gather(
+        db[ROLLUP_ISLAND_DAILY_COLLECTION].bulk_write([
+            UpdateOne(
+                {"_id": f"{island_id}:{day}"},
+                {"$inc": {"visits": count}, "$setOnInsert": {"island_id": island_id, "atoll": islands[island_id].atoll, "date": day}},
+                upsert=True,
+            )
+            for (island_id, day), count in island_daily.items()
+        ], ordered=False),
+        db[ROLLUP_ATOLL_DAILY_COLLECTION].bulk_write([
+            UpdateOne(
+                {"_id": f"{atoll}:{day}"},
+                {"$inc": {"visits": count}, "$setOnInsert": {"atoll": atoll, "date": day}},
+                upsert=True,
+            )
+            for (atoll, day), count in atoll_daily.items()
+        ], ordered=False),
+    )
+    
+    # Distinct counts only move for pairs this batch created
+    pair_visits = await asyncio.gather(*[
+        increment_pair(
+            ROLLUP_USER_ISLANDS_COLLECTION, f"{user_id}:{island_id}", "visits", count,
+            {"user_id": user_id, "island_id": island_id, "atoll": islands[island_id].atoll},
+        )
+        for island_id, count in pairs.items()
+    ])
+    new_islands = {island_id for (island_id, count), total in zip(pairs.items(), pair_visits) if total == count}
+    atoll_islands: Counter = Counter(islands[island_id].atoll for island_id in new_islands)
+    atoll_totals = await asyncio.gather(*[
+        increment_pair(
+            ROLLUP_USER_ATOLLS_COLLECTION, f"{user_id}:{atoll}", "islands", count,
+            {"user_id": user_id, "atoll": atoll},
+        )
+        for atoll, count in atoll_islands.items()
+    ])
+    new_atolls = sum(1 for (_, count), total in zip(atoll_islands.items(), atoll_totals) if total == count)
+    
+    await asyncio.gather(
+        db[ROLLUP_ISLANDS_COLLECTION].bulk_write([
+            UpdateOne(
+                {"_id": island_id},
+                {"$inc": {"visits": count, "visitors": int(island_id in new_islands)}},
+                upsert=True,
+            )
+            for island_id, count in pairs.items()
+        ], ordered=False),
+        db[ROLLUP_USERS_COLLECTION].update_one(
+            {"_id": user_id},
+            {"$inc": {"visits": len(visits), "islands": len(new_islands), "atolls": new_atolls},
+             "$currentDate": {"updated_at": True}},
+            upsert=True,
+        ),
+    )
+    atoll_visits: Counter = Counter(island.atoll for _, island in visits)
+    for atoll, count in atoll_visits.items():
+        leaderboards.apply(user_id, atoll, visits=count, islands=atoll_islands[atoll])
+    leaderboards.apply(user_id, None, atolls=new_atolls)
+    await leaderboards.changed()
+
+async def rebuild_rollups(batch_size: int = 5000):
+    # Built into side collections and swapped in at the end, so readers keep
+    # seeing the old rollups until the rebuild is complete. The scan stops at
+    # the newest visit _id at the start; visits written since then have their
+    # live increments in the old collections, which the swap discards, so they
+    # are replayed into the side collections until the rebuild has caught up,
+    # right before the swap. Only a visit written during the renames themselves
+    # can still be lost or counted twice.
+    suffix = "_rebuild"
+    for name in ROLLUP_COLLECTIONS:
+        await db[name + suffix].drop()
+    await island_catalog.load()
+    newest = await db[VISITS_COLLECTION].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    high_water = newest["_id"] if newest else None
+    
+    processed = 0
+    last_id = None
+    while high_water is not None:
+        query: Dict[str, Any] = {"_id": {"$lte": high_water}}
+        if last_id is not None:
+            query["_id"]["$gt"] = last_id
+        batch = await db[VISITS_COLLECTION].find(
+            query, {"_id": 1, "user_id": 1, "island_id": 1, "visit_date": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        
+        island_daily: Dict[tuple, int] = {}
+        atoll_daily: Dict[tuple, int] = {}
+        user_islands: Dict[tuple, int] = {}
+        for visit in batch:
+            island = await island_catalog.get(visit["island_id"])
+            if not island:
+                continue
+            day = visit_day(visit["visit_date"])
+            for counts, key in (
+                (island_daily, (island.id, island.atoll, day)),
+                (atoll_daily, (island.atoll, day)),
+                (user_islands, (visit["user_id"], island.id, island.atoll)),
+            ):
+                counts[key] = counts.get(key, 0) + 1
+        
+        writes = {
+            ROLLUP_ISLAND_DAILY_COLLECTION: [
+                UpdateOne({"_id": f"{island_id}:{day}"},
+                          {"$inc": {"visits": n}, "$setOnInsert": {"island_id": island_id, "atoll": atoll, "date": day}},
+                          upsert=True)
+                for (island_id, atoll, day), n in island_daily.items()
+            ],
+            ROLLUP_ATOLL_DAILY_COLLECTION: [
+                UpdateOne({"_id": f"{atoll}:{day}"},
+                          {"$inc": {"visits": n}, "$setOnInsert": {"atoll": atoll, "date": day}},
+                          upsert=True)
+                for (atoll, day), n in atoll_daily.items()
+            ],
+            ROLLUP_USER_ISLANDS_COLLECTION: [
+                UpdateOne({"_id": f"{user_id}:{island_id}"},
+                          {"$inc": {"visits": n}, "$setOnInsert": {"user_id": user_id, "island_id": island_id, "atoll": atoll}},
+                          upsert=True)
+                for (user_id, island_id, atoll), n in user_islands.items()
+            ],
+        }
+        for name, requests in writes.items():
+            if requests:
+                await db[name + suffix].bulk_write(requests, ordered=False)
+        processed += len(batch)
+        logger.info(f"Rollup rebuild: {processed} visits processed")
+    
+    # Distinct counts derive from the (user, island) pairs
+    derived = {
+        ROLLUP_USER_ATOLLS_COLLECTION: [
+            {"$group": {"_id": {"user_id": "$user_id", "atoll": "$atoll"}, "islands": {"$sum": 1}}},
+            {"$project": {
+                "_id": {"$concat": ["$_id.user_id", ":", "$_id.atoll"]},
+                "user_id": "$_id.user_id", "atoll": "$_id.atoll", "islands": 1,
+            }},
+        ],
+        ROLLUP_ISLANDS_COLLECTION: [
+            {"$group": {"_id": "$island_id", "visits": {"$sum": "$visits"}, "visitors": {"$sum": 1}}},
+        ],
+        ROLLUP_USERS_COLLECTION: [
+            {"$group": {
+                "_id": "$user_id",
+                "visits": {"$sum": "$visits"},
+                "islands": {"$sum": 1},
+                "atoll_set": {"$addToSet": "$atoll"},
+            }},
+            {"$project": {
+                "visits": 1, "islands": 1, "atolls": {"$size": "$atoll_set"},
+                # Leaderboard syncs resume from the newest updated_at
+                "updated_at": {"$literal": datetime.utcnow()},
+            }},
+        ],
+    }
+    for name, pipeline in derived.items():
+        await db[ROLLUP_USER_ISLANDS_COLLECTION + suffix].aggregate(
+            pipeline + [{"$out": name + suffix}]
+        ).to_list(None)
+    
+    caught_up = 0
+    last_id = high_water
+    while True:
+        query = {} if last_id is None else {"_id": {"$gt": last_id}}
+        batch = await db[VISITS_COLLECTION].find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+        for doc in batch:
+            doc.pop("_id")
+            visit = Visit(**doc)
+            island = await island_catalog.get(visit.island_id)
+            if island:
+                await apply_visit_rollups(visit, island, suffix=suffix)
+                caught_up += 1
+    
+    existing = set(await db.list_collection_names())
+    for name in ROLLUP_COLLECTIONS:
+        if name + suffix in existing:
+            await db[name + suffix].rename(name, dropTarget=True)
+        else:
+            await db[name].drop()
+    # Analytics cache entries and leaderboards everywhere follow this version,
+    # so results read from the old rollups are not served any longer
+    await collection_versions.bump(ROLLUPS_VERSION)
+    await ensure_indexes()
+    logger.info(f"Rollups rebuilt from {processed} visits, {caught_up} written during the rebuild replayed")
+
+class RollupBackfill:
+    # Rollups only cover visits written since they were introduced, so the
+    # first start on an older database rebuilds them in the background. The
+    # first worker to claim the job runs it; analytics and leaderboards fill
+    # in when the rebuild swaps in.
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def needed(self) -> bool:
+        return (await db[ROLLUP_ISLANDS_COLLECTION].estimated_document_count() == 0
+                and await db[VISITS_COLLECTION].estimated_document_count() > 0)
+
+    async def _run(self):
+        try:
+            await db[JOBS_COLLECTION].insert_one({"_id": "rollup_backfill", "started_at": datetime.utcnow()})
+        except DuplicateKeyError:
+            logger.warning("Visit rollups are empty and their backfill was already claimed; "
+                           "if it did not finish, run `python server.py --rebuild-rollups`")
+            return
+        logger.info("Visit rollups are empty; backfilling them from visits")
+        try:
+            await rebuild_rollups()
+            await db[JOBS_COLLECTION].update_one({"_id": "rollup_backfill"}, {"$set": {"finished_at": datetime.utcnow()}})
+        except PyMongoError as e:
+            logger.error(f"Rollup backfill failed, run `python server.py --rebuild-rollups`: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+rollup_backfill = RollupBackfill()
+
+# Leaderboards
+# One order-statistics list per (metric, atoll) board, sorted by descending
+# score: insert, remove and rank are O(log n), top-K is a slice. Global boards
+# use atoll None. Ties share a rank (1, 2, 2, 4).
+# Boards are loaded once and then kept current incrementally: this worker's
+# visit writes apply deltas directly, and a bump of the shared leaderboards
+# version makes the next read re-sync just the users whose rollups changed.
+# A rollup rebuild bumps the rollups version and forces a full reload.
+LEADERBOARD_METRICS = ("visits", "islands", "atolls")
+LEADERBOARDS_VERSION = "leaderboards"
+ROLLUPS_VERSION = "rollups"
+
+class RankedBoard:
+    def __init__(self):
+        self._scores: Dict[str, int] = {}
+        self._order = SortedList()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def add(self, user_id: str, delta: int):
+        old = self._scores.get(user_id, 0)
+        new = old + delta
+        if old > 0:
+            self._order.remove((-old, user_id))
+        if new > 0:
+            self._order.add((-new, user_id))
+            self._scores[user_id] = new
+        else:
+            self._scores.pop(user_id, None)
+
+    def set(self, user_id: str, score: int):
+        self.add(user_id, score - self._scores.get(user_id, 0))
+
+    def rank_of_score(self, score: int) -> int:
+        return self._order.bisect_left((-score, "")) + 1
+
+    def rank(self, user_id: str) -> Tuple[Optional[int], int]:
+        score = self._scores.get(user_id, 0)
+        return (self.rank_of_score(score) if score > 0 else None), score
+
+    def top(self, limit: int) -> List[Tuple[int, str, int]]:
+        return [(self.rank_of_score(-negated), user_id, -negated) for negated, user_id in self._order[:limit]]
+
+BoardKey = Tuple[str, Optional[str]]
+
+class Leaderboards:
+    def __init__(self, sync_overlap_seconds: float):
+        self.sync_overlap = timedelta(seconds=sync_overlap_seconds)
+        self._boards: Dict[BoardKey, RankedBoard] = {}
+        self._lock = asyncio.Lock()
+        # Users this worker applied deltas for while a load was reading
+        self._touched: Optional[set] = None
+        self._version: Optional[int] = None
+        self._rollups_version: Optional[int] = None
+        # Newest rollup_users.updated_at seen, where the next sync starts
+        self._synced_until: Optional[datetime] = None
+        # Rollup writes since the last bump of the shared version, and
+        # whether a bump is already on its way
+        self._dirty = False
+        self._bumping = False
+        self.loaded_at: Optional[datetime] = None
+        self.syncs = 0
+        self.bumps = 0
+
+    def board(self, metric: str, atoll: Optional[str] = None) -> RankedBoard:
+        return self._boards.get((metric, atoll)) or RankedBoard()
+
+    def _add(self, boards: Dict[BoardKey, RankedBoard], metric: str, atoll: Optional[str], user_id: str, delta: int):
+        if delta:
+            boards.setdefault((metric, atoll), RankedBoard()).add(user_id, delta)
+
+    def apply(self, user_id: str, atoll: Optional[str], visits: int = 0, islands: int = 0, atolls: int = 0):
+        # Per-atoll boards track visits and islands; `atoll` None only moves
+        # the global boards. Called after the rollup write it mirrors.
+        if self._touched is not None:
+            self._touched.add(user_id)
+        for metric, delta in (("visits", visits), ("islands", islands), ("atolls", atolls)):
+            self._add(self._boards, metric, None, user_id, delta)
+            if atoll is not None and metric != "atolls":
+                self._add(self._boards, metric, atoll, user_id, delta)
+
+    async def changed(self):
+        # Publishes this worker's rollup writes. Writes that land while a bump
+        # is in flight share the one that follows it, and a bump that was the
+        # only change since our last sync is adopted instead of re-synced.
+        self._dirty = True
+        if self._bumping:
+            return
+        self._bumping = True
+        try:
+            while self._dirty:
+                self._dirty = False
+                version = await collection_versions.bump(LEADERBOARDS_VERSION)
+                self.bumps += 1
+                if self._version == version - 1 and not self._lock.locked():
+                    self._version = version
+        finally:
+            self._bumping = False
+
+    async def _scores(self, user_ids: Optional[List[str]] = None) -> Tuple[Dict[BoardKey, Dict[str, int]], Optional[datetime]]:
+        # Current scores from the rollups, for everyone or just these users,
+        # and the newest rollup_users.updated_at among them
+        scores: Dict[BoardKey, Dict[str, int]] = {}
+        newest = None
+        by_user = {} if user_ids is None else {"user_id": {"$in": user_ids}}
+        async for doc in db[ROLLUP_USERS_COLLECTION].find({} if user_ids is None else {"_id": {"$in": user_ids}}):
+            for metric in LEADERBOARD_METRICS:
+                scores.setdefault((metric, None), {})[doc["_id"]] = doc.get(metric, 0)
+            updated_at = doc.get("updated_at")
+            if updated_at is not None and (newest is None or updated_at > newest):
+                newest = updated_at
+        async for doc in db[ROLLUP_USER_ATOLLS_COLLECTION].find(by_user, {"user_id": 1, "atoll": 1, "islands": 1}):
+            scores.setdefault(("islands", doc["atoll"]), {})[doc["user_id"]] = doc["islands"]
+        async for doc in db[ROLLUP_USER_ISLANDS_COLLECTION].aggregate([
+            {"$match": by_user},
+            {"$group": {"_id": {"user_id": "$user_id", "atoll": "$atoll"}, "visits": {"$sum": "$visits"}}},
+        ]):
+            scores.setdefault(("visits", doc["_id"]["atoll"]), {})[doc["_id"]["user_id"]] = doc["visits"]
+        return scores, newest
+
+    def _set(self, boards: Dict[BoardKey, RankedBoard], user_ids: List[str], scores: Dict[BoardKey, Dict[str, int]]):
+        # Absolute scores, so re-reading a user twice is harmless; boards the
+        # user has dropped off are zeroed
+        for key in set(boards) | set(scores):
+            board_scores = scores.get(key, {})
+            board = boards.get(key)
+            for user_id in user_ids:
+                score = board_scores.get(user_id, 0)
+                if board is None and score > 0:
+                    board = boards[key] = RankedBoard()
+                if board is not None:
+                    board.set(user_id, score)
+
+    async def load(self):
+        async with self._lock:
+            await self._load()
+
+    async def _load(self):
+        # Built aside and swapped in, so readers never see a half-built board.
+        # Deltas this worker applies meanwhile go to the old boards, so those
+        # users are re-read into the new ones before the swap.
+        rollups_version = collection_versions.get(ROLLUPS_VERSION)
+        version = collection_versions.get(LEADERBOARDS_VERSION)
+        self._touched = set()
+        try:
+            scores, newest = await self._scores()
+            boards: Dict[BoardKey, RankedBoard] = {}
+            for (metric, atoll), board_scores in scores.items():
+                for user_id, score in board_scores.items():
+                    self._add(boards, metric, atoll, user_id, score)
+            while self._touched:
+                touched, self._touched = list(self._touched), set()
+                fresh, _ = await self._scores(touched)
+                self._set(boards, touched, fresh)
+            self._boards = boards
+        finally:
+            self._touched = None
+        self._rollups_version = rollups_version
+        self._version = version
+        self._synced_until = newest
+        self.loaded_at = datetime.utcnow()
+        logger.info(f"Leaderboards loaded: {len(self.board('visits'))} travellers, {len(boards)} boards")
+
+    async def refresh(self):
+        # Cheap when nothing changed: two in-memory version comparisons
+        if (self._rollups_version == collection_versions.get(ROLLUPS_VERSION)
+                and self._version == collection_versions.get(LEADERBOARDS_VERSION)):
+            return
+        async with self._lock:
+            if self._rollups_version != collection_versions.get(ROLLUPS_VERSION):
+                await self._load()
+                return
+            version = collection_versions.get(LEADERBOARDS_VERSION)
+            if version == self._version:
+                return
+            query = {} if self._synced_until is None else {"updated_at": {"$gte": self._synced_until - self.sync_overlap}}
+            changed = []
+            newest = self._synced_until
+            async for doc in db[ROLLUP_USERS_COLLECTION].find(query, {"updated_at": 1}):
+                changed.append(doc["_id"])
+                updated_at = doc.get("updated_at")
+                if updated_at is not None and (newest is None or updated_at > newest):
+                    newest = updated_at
+            if changed:
+                scores, _ = await self._scores(changed)
+                self._set(self._boards, changed, scores)
+            self._version = version
+            self._synced_until = newest
+            self.syncs += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "boards": len(self._boards),
+            "travellers": len(self.board("visits")),
+            "loaded_at": self.loaded_at,
+            "version": self._version,
+            "syncs": self.syncs,
+            "bumps": self.bumps,
+        }
+
+leaderboards = Leaderboards(LEADERBOARD_SYNC_OVERLAP_SECONDS)
+
+# In-process ad index
+# Live ads are precomputed per placement together with the next start_date or
+# end_date boundary, so a read is a dict lookup; the index is recomputed the
+# first time a read crosses a boundary. JSON bodies are cached per placement.
+def as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class AdIndex:
+    def __init__(self):
+        self._ads: Dict[str, Ad] = {}
+        self._live: Dict[Optional[str], List[Ad]] = {}
+        self._serialized: Dict[Optional[str], bytes] = {}
+        self._next_boundary: Optional[datetime] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.shared_version: Optional[int] = None
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.loads = 0
+
+    async def load(self):
+        async with self._lock:
+            await self._load()
+
+    async def _load(self):
+        self.shared_version = collection_versions.get(ADS_COLLECTION)
+        self._loaded_at = time.monotonic()
+        ads = {}
+        async for doc in db[ADS_COLLECTION].find({}, {"_id": 0}):
+            ad = Ad(**doc)
+            ads[ad.id] = ad
+        self._ads = ads
+        self.loads += 1
+        self._rebuild()
+
+    def _rebuild(self):
+        now = datetime.utcnow()
+        live: Dict[Optional[str], List[Ad]] = {None: []}
+        boundaries = []
+        for ad in self._ads.values():
+            if not ad.is_active:
+                continue
+            start, end = as_naive_utc(ad.start_date), as_naive_utc(ad.end_date)
+            if start is not None and start > now:
+                boundaries.append(start)
+            # end_date is inclusive, so the ad leaves just after it
+            if end is not None and end >= now:
+                boundaries.append(end + timedelta(microseconds=1))
+            if (start is None or start <= now) and (end is None or end >= now):
+                live[None].append(ad)
+                live.setdefault(ad.placement, []).append(ad)
+        self._live = live
+        self._next_boundary = min(boundaries, default=None)
+        self._serialized = {}
+        self.version += 1
+        self.rebuilds += 1
+
+    def _stale(self) -> bool:
+        return (self._loaded_at is None
+                or self.shared_version != collection_versions.get(ADS_COLLECTION)
+                or time.monotonic() - self._loaded_at > AD_INDEX_REFRESH_SECONDS)
+
+    async def _refresh(self):
+        if self._stale():
+            # Concurrent readers share one reload
+            async with self._lock:
+                if self._stale():
+                    await self._load()
+        elif self._next_boundary is not None and datetime.utcnow() >= self._next_boundary:
+            self._rebuild()
+
+    async def live_json(self, placement: Optional[str]) -> bytes:
+        await self._refresh()
+        body = self._serialized.get(placement)
+        if body is None:
+            self.misses += 1
+            body = ad_list_adapter.dump_json(self._live.get(placement, [])[:100])
+            self._serialized[placement] = body
+        else:
+            self.hits += 1
+        return body
+
+    async def live_etag(self, placement: Optional[str]) -> str:
+        # Content hash of the live body, so every worker agrees on it
+        body = await self.live_json(placement)
+        return hashlib.blake2b(body, digest_size=8).hexdigest()
+
+    async def get(self, ad_id: str) -> Optional[Ad]:
+        await self._refresh()
+        return self._ads.get(ad_id)
+
+    async def live(self, placement: Optional[str]) -> List[Ad]:
+        await self._refresh()
+        return self._live.get(placement, [])
+
+    async def changed(self):
+        # Publishes a local put()/remove() to the other workers. If it was the
+        # only write since our last load, the index is already current.
+        version = await collection_versions.bump(ADS_COLLECTION)
+        if self.shared_version == version - 1 and not self._lock.locked():
+            self.shared_version = version
+
+    def put(self, ad: Ad):
+        self._ads[ad.id] = ad
+        self._rebuild()
+
+    def remove(self, ad_id: str):
+        if self._ads.pop(ad_id, None) is not None:
+            self._rebuild()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ads": len(self._ads),
+            "live": len(self._live.get(None, [])),
+            "placements": sorted(placement for placement in self._live if placement is not None),
+            "next_boundary": self._next_boundary,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds,
+            "loads": self.loads,
+        }
+
+ad_index = AdIndex()
+
+# Ad rotation engine
+# Picks N ads per placement by weighted sampling without replacement, after
+# dropping ads the visitor has hit the frequency cap for and ads running ahead
+# of their daily pacing. All state is in memory and fixed-size, so selection
+# is O(live ads for the placement) with no database round-trip.
+class CountMinSketch:
+    def __init__(self, width: int = 1 << 16, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self._rows = [array("I", bytes(4 * width)) for _ in range(depth)]
+
+    def _slots(self, key: str):
+        # One digest supplies an independent 32-bit hash per row
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        for row in range(self.depth):
+            yield self._rows[row], int.from_bytes(digest[4 * row:4 * row + 4], "little") % self.width
+
+    def add(self, key: str, count: int = 1):
+        for counters, slot in self._slots(key):
+            counters[slot] += count
+
+    def estimate(self, key: str) -> int:
+        return min(counters[slot] for counters, slot in self._slots(key))
+
+    def clear(self):
+        for counters in self._rows:
+            counters[:] = array("I", bytes(4 * self.width))
+
+class AdRotation:
+    def __init__(self, frequency_window: float):
+        # Serves are counted in the current sketch; estimates add the previous
+        # one, so a cap covers between one and two half-windows of history
+        self.half_window = frequency_window / 2
+        self._current = CountMinSketch()
+        self._previous = CountMinSketch()
+        self._rotated_at = time.monotonic()
+        self._paced: Dict[str, Tuple[str, int]] = {}  # ad id -> (day, serves)
+        self.selections = 0
+        self.capped = 0
+        self.paced_out = 0
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self._rotated_at >= self.half_window:
+            self._previous, self._current = self._current, self._previous
+            self._current.clear()
+            self._rotated_at = now
+
+    def _frequency(self, visitor: str, ad: Ad) -> int:
+        key = f"{visitor}:{ad.id}"
+        return self._current.estimate(key) + self._previous.estimate(key)
+
+    def _within_pace(self, ad: Ad, now: datetime) -> bool:
+        day = now.strftime("%Y-%m-%d")
+        served_day, served = self._paced.get(ad.id, (day, 0))
+        if served_day != day:
+            served = 0
+        elapsed = (now - now.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds() / 86400
+        # Allow one serve of slack so low budgets still start at midnight
+        return served < ad.daily_budget * elapsed + 1 and served < ad.daily_budget
+
+    def select(self, ads: List[Ad], count: int, visitor: Optional[str]) -> List[Ad]:
+        self._rotate()
+        now = datetime.utcnow()
+        eligible = []
+        for ad in ads:
+            if visitor and ad.frequency_cap and self._frequency(visitor, ad) >= ad.frequency_cap:
+                self.capped += 1
+                continue
+            if ad.daily_budget and not self._within_pace(ad, now):
+                self.paced_out += 1
+                continue
+            eligible.append(ad)
+        
+        # Efraimidis-Spirakis: the top `count` keys of u^(1/weight) are a
+        # weighted sample without replacement
+        chosen = sorted(eligible, key=lambda ad: random.random() ** (1 / ad.weight), reverse=True)[:count]
+        
+        day = now.strftime("%Y-%m-%d")
+        for ad in chosen:
+            if visitor:
+                self._current.add(f"{visitor}:{ad.id}")
+            if ad.daily_budget:
+                served_day, served = self._paced.get(ad.id, (day, 0))
+                self._paced[ad.id] = (day, served + 1 if served_day == day else 1)
+        self.selections += 1
+        return chosen
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "selections": self.selections,
+            "capped": self.capped,
+            "paced_out": self.paced_out,
+            "frequency_window_seconds": self.half_window * 2,
+            "sketch_bytes": 2 * self._current.depth * self._current.width * 4,
+        }
+
+ad_rotation = AdRotation(AD_FREQUENCY_WINDOW_SECONDS)
+
+# Ad event pipeline
+# Impressions and clicks land in a bounded ring buffer; a background task
+# drains it every few seconds into one $inc upsert per (ad, time bucket).
+class AdEventBuffer:
+    def __init__(self, size: int, flush_seconds: float, bucket_seconds: int, shutdown_policy: str):
+        self._events: deque = deque(maxlen=size)
+        self._pending: Dict[tuple, Dict[str, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.size = size
+        self.flush_seconds = flush_seconds
+        self.bucket_seconds = bucket_seconds
+        self.shutdown_policy = shutdown_policy
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flush_errors = 0
+
+    def record(self, ad: Ad, kind: str):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append((ad.id, ad.placement, kind, time.time()))
+        self.recorded += 1
+
+    def _drain(self):
+        # Fold buffered events into per-(ad, placement, bucket) counters
+        while self._events:
+            ad_id, placement, kind, timestamp = self._events.popleft()
+            bucket = int(timestamp // self.bucket_seconds * self.bucket_seconds)
+            counters = self._pending.setdefault((ad_id, placement, bucket), {"impressions": 0, "clicks": 0})
+            counters[kind] += 1
+
+    async def flush(self):
+        self._drain()
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        requests = [
+            UpdateOne(
+                {"_id": f"{ad_id}:{bucket}"},
+                {
+                    "$inc": counters,
+                    "$setOnInsert": {
+                        "ad_id": ad_id,
+                        "placement": placement,
+                        "bucket": datetime.fromtimestamp(bucket, timezone.utc).replace(tzinfo=None),
+                    },
+                },
+                upsert=True,
+            )
+            for (ad_id, placement, bucket), counters in pending.items()
+        ]
+        try:
+            await db[AD_STATS_COLLECTION].bulk_write(requests, ordered=False)
+        except PyMongoError as e:
+            # Keep the counters for the next attempt
+            self.flush_errors += 1
+            for key, counters in pending.items():
+                merged = self._pending.setdefault(key, {"impressions": 0, "clicks": 0})
+                for kind, count in counters.items():
+                    merged[kind] += count
+            logger.warning(f"Ad event flush failed, will retry: {e}")
+            return
+        self.flushed += sum(sum(counters.values()) for counters in pending.values())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.shutdown_policy == "flush":
+            await self.flush()
+        else:
+            self._drain()
+            lost = sum(sum(counters.values()) for counters in self._pending.values())
+            self._pending = {}
+            self.dropped += lost
+            logger.info(f"Dropped {lost} buffered ad events on shutdown")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._events),
+            "pending_counters": len(self._pending),
+            "buffer_size": self.size,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "flush_errors": self.flush_errors,
+            "shutdown_policy": self.shutdown_policy,
+        }
+
+ad_events = AdEventBuffer(
+    AD_EVENTS_BUFFER_SIZE, AD_EVENTS_FLUSH_SECONDS, AD_EVENTS_BUCKET_SECONDS, AD_EVENTS_SHUTDOWN_POLICY
+)
+
+# In-process blog search index
+# BM25 over title, tags, excerpt and content (HTML stripped), with per-field
+# weights folded into the term frequencies. Blog writes update it in place.
+BLOG_SEARCH_FIELD_WEIGHTS = {"title": 3.0, "tags": 2.0, "excerpt": 1.5, "content": 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_LENGTH = 200
+
+def html_to_text(value: str) -> str:
+    return html.unescape(re.sub(r"<[^>]+>", " ", value))
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+def highlight(text: str, terms: set) -> str:
+    # Matches are found in the raw text and every segment is escaped on its
+    # own, so only our <mark> tags reach the browser and entities stay whole
+    parts = []
+    last = 0
+    for match in re.finditer(r"\w+", text):
+        if match.group(0).lower() in terms:
+            parts.append(html.escape(text[last:match.start()]))
+            parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+            last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
+
+class BlogSearchIndex:
+    def __init__(self):
+        self._posts: Dict[str, BlogPost] = {}
+        self._text: Dict[str, str] = {}  # post id -> plain-text content
+        self._postings: Dict[str, Dict[str, float]] = {}  # term -> post id -> weighted tf
+        self._lengths: Dict[str, float] = {}
+        self._total_length = 0.0
+        self._shared_version: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self.version = 0
+
+    async def load(self):
+        async with self._lock:
+            await self._load()
+
+    async def _load(self):
+        # Built aside and swapped in, so searches during the scan see the old index
+        shared_version = collection_versions.get(BLOG_POSTS_COLLECTION)
+        fresh = BlogSearchIndex()
+        async for doc in db[BLOG_POSTS_COLLECTION].find({}, {"_id": 0}):
+            fresh.put(BlogPost(**doc))
+        self._posts, self._text, self._postings, self._lengths = fresh._posts, fresh._text, fresh._postings, fresh._lengths
+        self._total_length = fresh._total_length
+        self._shared_version = shared_version
+        self.version += 1
+        logger.info(f"Blog search index loaded {len(self._posts)} posts")
+
+    async def refresh(self):
+        # Another worker may have written posts; concurrent readers share one reload
+        if self._shared_version == collection_versions.get(BLOG_POSTS_COLLECTION):
+            return
+        async with self._lock:
+            if self._shared_version != collection_versions.get(BLOG_POSTS_COLLECTION):
+                await self._load()
+
+    def put(self, post: BlogPost):
+        self.remove(post.id)
+        text = html_to_text(post.content)
+        fields = {
+            "title": post.title,
+            "tags": " ".join(post.tags),
+            "excerpt": post.excerpt or "",
+            "content": text,
+        }
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, value in fields.items():
+            weight = BLOG_SEARCH_FIELD_WEIGHTS[field]
+            for term in tokenize(value):
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+                length += weight
+        for term, frequency in frequencies.items():
+            self._postings.setdefault(term, {})[post.id] = frequency
+        self._posts[post.id] = post
+        self._text[post.id] = text
+        self._lengths[post.id] = length
+        self._total_length += length
+        self.version += 1
+
+    def remove(self, post_id: str):
+        post = self._posts.pop(post_id, None)
+        if post is None:
+            return
+        for term in set(tokenize(" ".join([post.title, " ".join(post.tags), post.excerpt or "", self._text[post_id]]))):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(post_id, None)
+                if not postings:
+                    del self._postings[term]
+        del self._text[post_id]
+        self._total_length -= self._lengths.pop(post_id)
+        self.version += 1
+
+    def search(self, query: str, published_only: bool = True) -> List[Tuple[float, BlogPost]]:
+        count = len(self._posts)
+        if not count:
+            return []
+        average_length = self._total_length / count
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term, {})
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for post_id, frequency in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[post_id] / average_length)
+                scores[post_id] = scores.get(post_id, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        results = [
+            (score, self._posts[post_id]) for post_id, score in scores.items()
+            if self._posts[post_id].is_published or not published_only
+        ]
+        results.sort(key=lambda result: (-result[0], result[1].id))
+        return results
+
+    def snippet(self, post: BlogPost, terms: set) -> str:
+        text = " ".join(self._text[post.id].split())
+        lowered = text.lower()
+        positions = [match.start() for term in terms for match in [re.search(rf"\b{re.escape(term)}\b", lowered)] if match]
+        start = max(0, min(positions) - SNIPPET_LENGTH // 4) if positions else 0
+        snippet = text[start:start + SNIPPET_LENGTH]
+        return ("…" if start else "") + highlight(snippet, terms) + ("…" if start + SNIPPET_LENGTH < len(text) else "")
+
+blog_search_index = BlogSearchIndex()
+
+# Badge rules
+# Badge criteria are compiled once into rules. Each visit advances only the
+# rules the user hasn't earned yet, against a per (badge, user) progress
+# document: a counter for visits, plus the distinct keys already seen for
+# island/atoll metrics, so awarding is O(rules) per visit, not O(visits).
+class BadgeRule:
+    def __init__(self, badge: Badge):
+        self.badge = badge
+        self.criteria = BadgeCriteria(**badge.criteria)
+        self.start = as_naive_utc(self.criteria.start)
+        self.end = as_naive_utc(self.criteria.end)
+
+    def matches(self, visit_date: datetime, island: Island) -> bool:
+        criteria = self.criteria
+        if criteria.type is not None and island.type != criteria.type:
+            return False
+        if criteria.atoll is not None and island.atoll != criteria.atoll:
+            return False
+        visit_date = as_naive_utc(visit_date)
+        if self.start is not None and visit_date < self.start:
+            return False
+        if self.end is not None and visit_date >= self.end:
+            return False
+        return True
+
+    def key(self, island: Island) -> Optional[str]:
+        if self.criteria.metric == "visits":
+            return None
+        return island.atoll if self.criteria.metric == "atolls" else island.id
+
+    def target(self) -> int:
+        if self.criteria.metric == "atoll_coverage":
+            return max(1, math.ceil(self.criteria.min * island_catalog.atoll_size(self.criteria.atoll)))
+        return math.ceil(self.criteria.min)
 
-class TokenData(BaseModel):
-    user_id: Optional[str] = None
+class BadgeEngine:
+    def __init__(self):
+        self._rules: Dict[str, BadgeRule] = {}
+        self._version: Optional[int] = None
+        # Badge ids waiting for a background re-evaluation; None means all
+        self._queued: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self.awarded = 0
 
-# Helper Functions
-def parse_json(data):
-    return json.loads(json_util.dumps(data))
+    async def load(self):
+        rules = {}
+        async for doc in db[BADGES_COLLECTION].find({}, {"_id": 0}):
+            badge = Badge(**doc)
+            try:
+                rules[badge.id] = BadgeRule(badge)
+            except ValidationError as e:
+                logger.error(f"Skipping badge {badge.name!r} with invalid criteria: {e}")
+        self._rules = rules
+        self._version = collection_versions.get(BADGES_COLLECTION)
+        logger.info(f"Badge engine loaded {len(rules)} rules")
 
-def get_password_hash(password: str) -> str:
-    return hash.bcrypt.hash(password)
+    async def rules(self) -> List[BadgeRule]:
+        # Another worker may have edited the badges
+        if self._version != collection_versions.get(BADGES_COLLECTION):
+            await self.load()
+        return list(self._rules.values())
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return hash.bcrypt.verify(plain_password, hashed_password)
+    def _progress_update(self, rule: BadgeRule, user_id: str, visits: int, keys: set):
+        # Merges into whatever progress exists, so concurrent visit writes and
+        # a re-evaluation can't overwrite each other. Distinct-key metrics
+        # union the keys and recount, so keys already seen don't move count.
+        if rule.criteria.metric == "visits":
+            return {"$inc": {"count": visits}, "$setOnInsert": {"badge_id": rule.badge.id, "user_id": user_id}}
+        return [
+            {"$set": {
+                "badge_id": rule.badge.id,
+                "user_id": user_id,
+                "seen": {"$setUnion": [{"$ifNull": ["$seen", []]}, {"$literal": sorted(keys)}]},
+            }},
+            {"$set": {"count": {"$size": "$seen"}}},
+        ]
 
-async def get_user_by_email(email: str):
-    user = await db[USERS_COLLECTION].find_one({"email": email})
-    if user:
-        return UserInDB(**user)
-    return None
+    async def _advance(self, rule: BadgeRule, user_id: str, visits: int, keys: set) -> int:
+        # One write per rule for a whole batch of visits; returns the new count
+        update = self._progress_update(rule, user_id, visits, keys)
+        for attempt in range(2):
+            try:
+                doc = await db[BADGE_PROGRESS_COLLECTION].find_one_and_update(
+                    {"_id": f"{rule.badge.id}:{user_id}"},
+                    update,
+                    projection={"count": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+                return doc["count"]
+            except DuplicateKeyError:
+                # A concurrent request created the document first; now it exists
+                if attempt:
+                    raise
 
-async def get_user_by_id(user_id: str):
-    user = await db[USERS_COLLECTION].find_one({"id": user_id})
-    if user:
-        return UserInDB(**user)
-    return None
+    async def _evaluate(self, rule: BadgeRule, user_id: str, visits: List[Tuple[Visit, Island]]) -> bool:
+        matched = [island for visit, island in visits if rule.matches(visit.visit_date, island)]
+        if not matched:
+            return False
+        count = await self._advance(rule, user_id, len(matched), {rule.key(island) for island in matched})
+        return count >= rule.target()
 
-async def authenticate_user(email: str, password: str):
-    user = await get_user_by_email(email)
-    if not user:
-        return False
-    if not verify_password(password, user.hashed_password):
-        return False
-    return user
+    async def on_visits(self, user: User, visits: List[Tuple[Visit, Island]]) -> List[str]:
+        rules = [rule for rule in await self.rules() if rule.badge.id not in user.badges]
+        earned = await asyncio.gather(*[self._evaluate(rule, user.id, visits) for rule in rules])
+        badge_ids = [rule.badge.id for rule, won in zip(rules, earned) if won]
+        if badge_ids:
+            await db[USERS_COLLECTION].update_one({"id": user.id}, {"$addToSet": {"badges": {"$each": badge_ids}}})
+            self.awarded += len(badge_ids)
+        return badge_ids
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    async def reevaluate(self, badge_ids: Optional[List[str]] = None, batch_size: int = 1000) -> Dict[str, int]:
+        # Recomputes progress for the given badges (all by default) from the
+        # visit history, one user at a time. Earned badges are never revoked.
+        # Visits written meanwhile merge with the rebuilt progress rather than
+        # being overwritten by it (see _progress_update).
+        await self.load()
+        rules = [rule for rule in self._rules.values() if badge_ids is None or rule.badge.id in badge_ids]
+        if not rules:
+            return {"badges": 0, "users": 0, "qualifying": 0}
+        await db[BADGE_PROGRESS_COLLECTION].delete_many({"badge_id": {"$in": [rule.badge.id for rule in rules]}})
+        islands = {island.id: island for island in await island_catalog.all()}
+        users = qualifying = 0
+        
+        async def flush(user_id: str, state: Dict[str, Any]):
+            nonlocal qualifying
+            writes = []
+            earned = []
+            for rule in rules:
+                seen = state[rule.badge.id]
+                count = seen if isinstance(seen, int) else len(seen)
+                if not count:
+                    continue
+                if isinstance(seen, int):
+                    # $max: a live visit may already have counted itself here
+                    update = {"$max": {"count": count}, "$setOnInsert": {"badge_id": rule.badge.id, "user_id": user_id}}
+                else:
+                    update = self._progress_update(rule, user_id, count, seen)
+                writes.append(UpdateOne({"_id": f"{rule.badge.id}:{user_id}"}, update, upsert=True))
+                if count >= rule.target():
+                    earned.append(rule.badge.id)
+            if writes:
+                await db[BADGE_PROGRESS_COLLECTION].bulk_write(writes, ordered=False)
+            if earned:
+                await db[USERS_COLLECTION].update_one({"id": user_id}, {"$addToSet": {"badges": {"$each": earned}}})
+            qualifying += len(earned)
+        
+        def fresh_state() -> Dict[str, Any]:
+            return {rule.badge.id: 0 if rule.criteria.metric == "visits" else set() for rule in rules}
+        
+        user_id, state = None, fresh_state()
+        visits_cursor = db[VISITS_COLLECTION].find(
+            {}, {"_id": 0, "user_id": 1, "island_id": 1, "visit_date": 1}
+        ).sort("user_id", 1).batch_size(batch_size)
+        async for visit in visits_cursor:
+            if visit["user_id"] != user_id:
+                if user_id is not None:
+                    await flush(user_id, state)
+                user_id, state = visit["user_id"], fresh_state()
+                users += 1
+            island = islands.get(visit["island_id"])
+            if island is None:
+                continue
+            for rule in rules:
+                if rule.matches(visit["visit_date"], island):
+                    key = rule.key(island)
+                    if key is None:
+                        state[rule.badge.id] += 1
+                    else:
+                        state[rule.badge.id].add(key)
+        if user_id is not None:
+            await flush(user_id, state)
+        logger.info(f"Re-evaluated {len(rules)} badges for {users} users, {qualifying} badges held")
+        return {"badges": len(rules), "users": users, "qualifying": qualifying}
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        token_data = TokenData(user_id=user_id)
-    except jwt.PyJWTError:
-        raise credentials_exception
-    user = await get_user_by_id(token_data.user_id)
-    if user is None:
-        raise credentials_exception
-    return user
+    def schedule_reevaluate(self, badge_ids: Optional[List[str]] = None):
+        # Admin routes queue a re-evaluation instead of scanning every visit
+        # inside the request. Runs are serialized; anything queued during a
+        # run is merged into the next one.
+        self._queued.update([None] if badge_ids is None else badge_ids)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_queued())
 
-async def get_current_admin(current_user: User = Depends(get_current_user)):
-    if not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions"
-        )
-    return current_user
+    async def _run_queued(self):
+        while self._queued:
+            badge_ids = None if None in self._queued else list(self._queued)
+            self._queued = set()
+            try:
+                await self.reevaluate(badge_ids)
+            except PyMongoError as e:
+                logger.error(f"Badge re-evaluation failed: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def progress(self, user: User) -> List[BadgeProgress]:
+        rules = await self.rules()
+        counts = {
+            doc["badge_id"]: doc["count"]
+            async for doc in db[BADGE_PROGRESS_COLLECTION].find({"user_id": user.id}, {"badge_id": 1, "count": 1})
+        }
+        return [
+            BadgeProgress(
+                **rule.badge.model_dump(),
+                count=counts.get(rule.badge.id, 0),
+                target=rule.target(),
+                earned=rule.badge.id in user.badges,
+            )
+            for rule in rules
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rules": len(self._rules),
+            "awarded": self.awarded,
+            "reevaluating": self._task is not None and not self._task.done(),
+            "queued": len(self._queued),
+        }
+
+badge_engine = BadgeEngine()
 
 # API Routes - Auth
 @api_router.post("/register", response_model=User)
@@ -257,7 +2607,7 @@ async def register_user(user_data: UserCreate):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user_in_db = UserInDB(
         **user_data.model_dump(exclude={"password"}),
         hashed_password=hashed_password
@@ -285,28 +2635,186 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 @api_router.get("/users/me", response_model=User)
 async def read_users_me(current_user: User = Depends(get_current_user)):
-    return current_user
+    return await with_fresh_counters(current_user)
 
 # API Routes - Islands
+# Sort keys for island listings; the island id breaks ties so cursors are stable
+ISLAND_SORT_KEYS = {
+    "name": lambda island: island.name.lower(),
+    "atoll": lambda island: [island.atoll.lower(), island.name.lower()],
+    "population": lambda island: [island.population is not None, island.population or 0],
+    "created_at": lambda island: island.created_at.isoformat(),
+}
+
 @api_router.get("/islands", response_model=List[Island])
-async def get_islands(type: Optional[str] = None):
-    query = {}
+async def get_islands(
+    response: Response,
+    type: Optional[str] = None,
+    atoll: Optional[str] = None,
+    tag: Optional[str] = None,
+    q: Optional[str] = None,
+    sort: str = "name",
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+):
+    sort_field = sort.lstrip("-")
+    descending = sort.startswith("-")
+    if sort_field not in ISLAND_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort field: {sort_field}")
+    sort_key = ISLAND_SORT_KEYS[sort_field]
+    
+    islands = await island_catalog.query(
+        type=type if type != "all" else None,
+        atoll=atoll if atoll != "all" else None,
+        tag=tag,
+        q=q,
+    )
+    total = len(islands)
+    islands.sort(key=lambda island: [sort_key(island), island.id], reverse=descending)
+    
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            islands = [
+                island for island in islands
+                if ([sort_key(island), island.id] < after if descending else [sort_key(island), island.id] > after)
+            ]
+        except TypeError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if limit is not None and len(islands) > limit:
+        islands = islands[:limit]
+        last = islands[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([sort_key(last), last.id])
+    response.headers["X-Total-Count"] = str(total)
+    return json_response(island_list_adapter, islands, response)
+
+# Map viewport clustering: below this zoom level nearby islands are merged
+# into grid-cell clusters; a cell is roughly a quarter of a map tile wide
+CLUSTER_MAX_ZOOM = 10
+
+def cluster_islands(islands: List[Island], zoom: int) -> IslandViewport:
+    if zoom >= CLUSTER_MAX_ZOOM:
+        return IslandViewport(islands=islands, clusters=[])
+    cell_size = 90.0 / (2 ** zoom)
+    cells: Dict[tuple, List[Island]] = {}
+    for island in islands:
+        key = (math.floor(island.lat / cell_size), math.floor(island.lng / cell_size))
+        cells.setdefault(key, []).append(island)
+    
+    viewport = IslandViewport(islands=[], clusters=[])
+    for members in cells.values():
+        if len(members) == 1:
+            viewport.islands.append(members[0])
+            continue
+        viewport.clusters.append(IslandCluster(
+            lat=sum(island.lat for island in members) / len(members),
+            lng=sum(island.lng for island in members) / len(members),
+            count=len(members),
+            island_ids=[island.id for island in members],
+        ))
+    return viewport
+
+@api_router.get("/islands/viewport", response_model=IslandViewport)
+async def get_islands_in_viewport(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lng: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lng: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(CLUSTER_MAX_ZOOM, ge=0, le=22),
+    type: Optional[str] = None,
+):
+    if min_lat >= max_lat or min_lng >= max_lng:
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+    
+    query: Dict[str, Any] = {}
+    # A 2dsphere polygon must fit in one hemisphere; wider views are the
+    # whole archipelago anyway
+    if max_lng - min_lng < 180:
+        query["location"] = {"$geoWithin": {"$geometry": {
+            "type": "Polygon",
+            "coordinates": [[
+                [min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat],
+                [min_lng, max_lat], [min_lng, min_lat],
+            ]],
+        }}}
+    else:
+        query["lat"] = {"$gte": min_lat, "$lte": max_lat}
     if type and type != "all":
         query["type"] = type
-    islands = await db[ISLANDS_COLLECTION].find(query).to_list(1000)
-    return [Island(**island) for island in islands]
+    
+    islands = await db[ISLANDS_COLLECTION].find(query, {"_id": 0}).to_list(None)
+    return cluster_islands([Island(**island) for island in islands], zoom)
+
+@api_router.get("/islands/nearest", response_model=List[NearbyIsland])
+async def get_nearest_islands(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=100),
+    max_distance_km: Optional[float] = Query(None, gt=0),
+    type: Optional[str] = None,
+):
+    geo_near: Dict[str, Any] = {
+        "near": geo_point(lat, lng),
+        "distanceField": "distance_km",
+        "distanceMultiplier": 0.001,  # metres to kilometres
+        "spherical": True,
+    }
+    if max_distance_km is not None:
+        geo_near["maxDistance"] = max_distance_km * 1000
+    if type and type != "all":
+        geo_near["query"] = {"type": type}
+    
+    islands = await db[ISLANDS_COLLECTION].aggregate([
+        {"$geoNear": geo_near},
+        {"$limit": k},
+        {"$project": {"_id": 0}},
+    ]).to_list(k)
+    return [NearbyIsland(**island) for island in islands]
+
+@api_router.get("/islands/atolls")
+async def get_island_atolls():
+    await island_catalog.all()
+    return island_catalog.atolls()
+
+# Registered ahead of /islands/{island_id} so "visited" is not taken for an id
+@api_router.get("/islands/visited", response_model=List[VisitedIsland])
+async def get_visited_islands(current_user: User = Depends(get_current_user)):
+    # One round-trip: collapse the user's visits to one row per island, then
+    # join island details from the in-memory catalog
+    visit_summaries = await db[VISITS_COLLECTION].aggregate([
+        {"$match": {"user_id": current_user.id}},
+        {"$group": {
+            "_id": "$island_id",
+            "first_visit": {"$min": "$visit_date"},
+            "last_visit": {"$max": "$visit_date"},
+            "visit_count": {"$sum": 1},
+        }},
+        {"$sort": {"last_visit": -1}},
+    ]).to_list(None)
+    
+    visited_islands = []
+    for summary in visit_summaries:
+        island = await island_catalog.get(summary.pop("_id"))
+        if island:
+            visited_islands.append(VisitedIsland(**island.model_dump(), **summary))
+    return visited_islands
 
 @api_router.get("/islands/{island_id}", response_model=Island)
 async def get_island(island_id: str):
-    island = await db[ISLANDS_COLLECTION].find_one({"id": island_id})
+    island = await island_catalog.get(island_id)
     if not island:
         raise HTTPException(status_code=404, detail="Island not found")
-    return Island(**island)
+    return island
 
 @api_router.post("/islands", response_model=Island)
 async def create_island(island_data: IslandCreate):
     island = Island(**island_data.model_dump())
-    await db[ISLANDS_COLLECTION].insert_one(island.model_dump())
+    await db[ISLANDS_COLLECTION].insert_one(island.document())
+    island_catalog.put(island)
+    await island_catalog.changed()
+    if island.is_featured:
+        await collection_versions.bump(FEATURED_ISLANDS_VERSION)
     return island
 
 # API Routes - Visits
@@ -316,7 +2824,7 @@ async def create_visit(
     current_user: User = Depends(get_current_user)
 ):
     # Check if island exists
-    island = await db[ISLANDS_COLLECTION].find_one({"id": visit_data.island_id})
+    island = await island_catalog.get(visit_data.island_id)
     if not island:
         raise HTTPException(status_code=404, detail="Island not found")
     
@@ -328,52 +2836,270 @@ async def create_visit(
     
     await db[VISITS_COLLECTION].insert_one(visit.model_dump())
     
-    # Update user visit count
-    await db[USERS_COLLECTION].update_one(
+    # Update user visit count; the badges it returns are current, unlike the cached principal's
+    counters = await db[USERS_COLLECTION].find_one_and_update(
         {"id": current_user.id},
-        {"$inc": {"visits_count": 1}}
+        {"$inc": {"visits_count": 1}},
+        projection=USER_COUNTER_FIELDS,
+        return_document=ReturnDocument.AFTER,
     )
+    await apply_visit_rollups(visit, island)
+    await badge_engine.on_visits(current_user.model_copy(update=counters or {}), [(visit, island)])
     
     return visit
 
-@api_router.get("/visits/user", response_model=List[Visit])
-async def get_user_visits(current_user: User = Depends(get_current_user)):
-    visits = await db[VISITS_COLLECTION].find({"user_id": current_user.id}).to_list(1000)
-    return [Visit(**visit) for visit in visits]
+@api_router.post("/visits/batch", response_model=VisitBatchResult)
+async def create_visits_batch(
+    batch: VisitBatch,
+    current_user: User = Depends(get_current_user)
+):
+    # Offline sync: items carry a client-generated client_id, so a retried
+    # upload reports "duplicate" with the stored visit instead of logging twice
+    results: List[Optional[VisitBatchItemResult]] = [None] * len(batch.visits)
+    islands = await island_catalog.get_many(list({item.island_id for item in batch.visits}))
+    client_ids = list({item.client_id for item in batch.visits})
+    existing = {
+        doc["client_id"]: Visit(**doc)
+        async for doc in db[VISITS_COLLECTION].find(
+            {"user_id": current_user.id, "client_id": {"$in": client_ids}}, {"_id": 0}
+        )
+    }
+    
+    pending: Dict[str, Tuple[int, Visit, Island]] = {}
+    for index, item in enumerate(batch.visits):
+        if item.client_id in existing or item.client_id in pending:
+            continue
+        island = islands.get(item.island_id)
+        if island is None:
+            results[index] = VisitBatchItemResult(client_id=item.client_id, status="error", error="Island not found")
+            continue
+        pending[item.client_id] = (index, Visit(**item.model_dump(), user_id=current_user.id), island)
+    
+    if pending:
+        try:
+            await db[VISITS_COLLECTION].insert_many(
+                [visit.model_dump() for _, visit, _ in pending.values()], ordered=False
+            )
+        except BulkWriteError as e:
+            # A concurrent sync of the same items won the unique index race;
+            # anything else is reported against the item
+            lost = {}
+            entries = list(pending.values())
+            for error in e.details["writeErrors"]:
+                index, visit, _ = entries[error["index"]]
+                lost[visit.client_id] = error
+                del pending[visit.client_id]
+                if error["code"] != 11000:
+                    results[index] = VisitBatchItemResult(client_id=visit.client_id, status="error", error=error["errmsg"])
+            async for doc in db[VISITS_COLLECTION].find(
+                {"user_id": current_user.id, "client_id": {"$in": list(lost)}}, {"_id": 0}
+            ):
+                existing[doc["client_id"]] = Visit(**doc)
+    
+    if pending:
+        counters = await db[USERS_COLLECTION].find_one_and_update(
+            {"id": current_user.id},
+            {"$inc": {"visits_count": len(pending)}},
+            projection=USER_COUNTER_FIELDS,
+            return_document=ReturnDocument.AFTER,
+        )
+        created_visits = [(visit, island) for _, visit, island in pending.values()]
+        await apply_user_visit_rollups(current_user.id, created_visits)
+        badges_awarded = await badge_engine.on_visits(current_user.model_copy(update=counters or {}), created_visits)
+    else:
+        badges_awarded = []
+    
+    created = {index for index, _, _ in pending.values()}
+    for index, item in enumerate(batch.visits):
+        if results[index] is not None:
+            continue
+        if index in created:
+            results[index] = VisitBatchItemResult(client_id=item.client_id, status="created", visit=pending[item.client_id][1])
+        elif item.client_id in existing:
+            results[index] = VisitBatchItemResult(client_id=item.client_id, status="duplicate", visit=existing[item.client_id])
+        elif item.client_id in pending:
+            # Repeated within this batch; points at the copy that was created
+            results[index] = VisitBatchItemResult(client_id=item.client_id, status="duplicate", visit=pending[item.client_id][1])
+        else:
+            # An earlier copy in this batch failed for a reason other than a duplicate
+            results[index] = VisitBatchItemResult(client_id=item.client_id, status="error", error="Not created")
+    
+    return VisitBatchResult(
+        created=len(created),
+        duplicates=sum(1 for result in results if result.status == "duplicate"),
+        failed=sum(1 for result in results if result.status == "error"),
+        results=results,
+        badges_awarded=badges_awarded,
+    )
 
-@api_router.get("/islands/visited", response_model=List[Island])
-async def get_visited_islands(current_user: User = Depends(get_current_user)):
-    # Get all visit records for the user
-    visits = await db[VISITS_COLLECTION].find({"user_id": current_user.id}).to_list(1000)
-    island_ids = [visit["island_id"] for visit in visits]
+@api_router.get("/visits/user", response_model=List[Visit])
+async def get_user_visits(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    island_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    # Newest first, keyset-paginated on (visit_date, id)
+    query: Dict[str, Any] = {"user_id": current_user.id}
+    if island_id:
+        query["island_id"] = island_id
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            visit_date, visit_id = datetime.fromisoformat(after[0]), after[1]
+        except (IndexError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query["$or"] = [
+            {"visit_date": {"$lt": visit_date}},
+            {"visit_date": visit_date, "id": {"$lt": visit_id}},
+        ]
+    visits_cursor = db[VISITS_COLLECTION].find(query, {"_id": 0}).sort(
+        [("visit_date", -1), ("id", -1)]
+    )
+    
+    if format == "ndjson":
+        # Stream the whole remaining history as the Motor cursor yields it
+        async def stream_visits():
+            async for visit in visits_cursor:
+                yield Visit(**visit).model_dump_json() + "\n"
+        return StreamingResponse(stream_visits(), media_type="application/x-ndjson")
     
-    # Get the island details for visited islands
-    if island_ids:
-        islands = await db[ISLANDS_COLLECTION].find({"id": {"$in": island_ids}}).to_list(1000)
-        return [Island(**island) for island in islands]
-    return []
+    # Fetch one extra row to learn whether another page exists
+    visits = [Visit(**visit) for visit in await visits_cursor.limit(limit + 1).to_list(limit + 1)]
+    if len(visits) > limit:
+        visits = visits[:limit]
+        last = visits[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last.visit_date.isoformat(), last.id])
+    return visits
 
 # API Routes - Blog
-@api_router.get("/blog", response_model=List[BlogPost])
+# Summary listings project the body away in Mongo; only a short prefix is
+# read to derive an excerpt for posts that have none
+BLOG_SUMMARY_PROJECTION = {
+    "_id": 0,
+    **{field: 1 for field in BlogPostSummary.model_fields if field != "excerpt"},
+    "excerpt": 1,
+    # A hand-written excerpt wins; only posts without one ship a content slice
+    "content_preview": {"$cond": [
+        {"$eq": [{"$ifNull": ["$excerpt", ""]}, ""]},
+        {"$substrCP": ["$content", 0, 400]},
+        "",
+    ]},
+}
+EXCERPT_LENGTH = 150
+
+def blog_post_summary(doc: Dict[str, Any]) -> BlogPostSummary:
+    preview = doc.pop("content_preview", "") or ""
+    if not doc.get("excerpt"):
+        text = " ".join(html_to_text(preview).split())
+        doc["excerpt"] = text[:EXCERPT_LENGTH] + "..." if len(text) > EXCERPT_LENGTH else text
+    return BlogPostSummary(**doc)
+
+@api_router.get("/blog", response_model=List[Union[BlogPost, BlogPostSummary]])
 async def get_blog_posts(
-    skip: int = 0, 
-    limit: int = 10, 
+    response: Response,
+    skip: int = 0,
+    limit: int = Query(10, ge=1, le=1000),
     tag: Optional[str] = None,
-    published_only: bool = True
+    published_only: bool = True,
+    cursor: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
 ):
-    query = {"is_published": True} if published_only else {}
+    query: Dict[str, Any] = {"is_published": True} if published_only else {}
     if tag:
         query["tags"] = tag
+    response.headers["X-Total-Count"] = str(await db[BLOG_POSTS_COLLECTION].count_documents(query))
+    
+    # Newest first, keyset-paginated on (published_date, id); unpublished
+    # drafts have no date and sort last. `skip` is kept for older clients.
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            after_date = datetime.fromisoformat(after[0]) if after[0] else None
+            after_id = str(after[1])
+        except (IndexError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if after_date is None:
+            query["published_date"] = None
+            query["id"] = {"$lt": after_id}
+        else:
+            query["$or"] = [
+                {"published_date": {"$lt": after_date}},
+                {"published_date": after_date, "id": {"$lt": after_id}},
+                {"published_date": None},
+            ]
     
-    blog_posts = await db[BLOG_POSTS_COLLECTION].find(query).skip(skip).limit(limit).to_list(limit)
-    return [BlogPost(**post) for post in blog_posts]
+    projection = BLOG_SUMMARY_PROJECTION if view == "summary" else {"_id": 0}
+    posts_cursor = db[BLOG_POSTS_COLLECTION].find(query, projection).sort(
+        [("published_date", -1), ("id", -1)]
+    )
+    if skip:
+        posts_cursor = posts_cursor.skip(skip)
+    blog_posts = await posts_cursor.limit(limit + 1).to_list(limit + 1)
+    
+    if len(blog_posts) > limit:
+        blog_posts = blog_posts[:limit]
+        last = blog_posts[-1]
+        published_date = last.get("published_date")
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            [published_date.isoformat() if published_date else None, last["id"]]
+        )
+    
+    if view == "summary":
+        return json_response(blog_summary_list_adapter, [blog_post_summary(post) for post in blog_posts], response)
+    return json_response(blog_post_list_adapter, [BlogPost(**post) for post in blog_posts], response)
+
+@api_router.get("/blog/search", response_model=List[BlogSearchResult])
+async def search_blog_posts(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+):
+    await blog_search_index.refresh()
+    results = blog_search_index.search(q)
+    response.headers["X-Total-Count"] = str(len(results))
+    
+    # Keyset on (score, id) in ranking order
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            after_score, after_id = float(after[0]), str(after[1])
+        except (IndexError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        results = [
+            (score, post) for score, post in results
+            if score < after_score or (score == after_score and post.id > after_id)
+        ]
+    
+    if len(results) > limit:
+        results = results[:limit]
+        last_score, last_post = results[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last_score, last_post.id])
+    
+    terms = set(tokenize(q))
+    return [
+        BlogSearchResult(
+            **post.model_dump(include={"id", "slug", "title", "excerpt", "featured_image", "tags", "published_date"}),
+            score=score,
+            title_highlight=highlight(post.title, terms),
+            snippet=blog_search_index.snippet(post, terms),
+        )
+        for score, post in results
+    ]
 
 @api_router.get("/blog/{slug}", response_model=BlogPost)
-async def get_blog_post(slug: str):
-    post = await db[BLOG_POSTS_COLLECTION].find_one({"slug": slug})
+async def get_blog_post(slug: str, response: Response):
+    post = await db[BLOG_POSTS_COLLECTION].find_one({"slug": slug}, {"_id": 0})
     if not post:
         raise HTTPException(status_code=404, detail="Blog post not found")
-    return BlogPost(**post)
+    post = BlogPost(**post)
+    if not post.is_published:
+        # Drafts must not be kept by shared caches
+        response.headers["Cache-Control"] = PRIVATE_CACHE_CONTROL
+    return json_response(blog_post_adapter, post, response)
 
 # Admin Routes - Blog Management
 @api_router.post("/admin/blog", response_model=BlogPost)
@@ -402,6 +3128,10 @@ async def create_blog_post(
     )
     
     await db[BLOG_POSTS_COLLECTION].insert_one(blog_post.model_dump())
+    blog_search_index.put(blog_post)
+    await collection_versions.bump(BLOG_POSTS_COLLECTION)
+    if blog_post.is_featured:
+        await collection_versions.bump(FEATURED_ARTICLES_VERSION)
     return blog_post
 
 @api_router.put("/admin/blog/{post_id}", response_model=BlogPost)
@@ -440,8 +3170,12 @@ async def update_blog_post(
         {"$set": update_data}
     )
     
-    updated_post = await db[BLOG_POSTS_COLLECTION].find_one({"id": post_id})
-    return BlogPost(**updated_post)
+    updated_post = BlogPost(**await db[BLOG_POSTS_COLLECTION].find_one({"id": post_id}))
+    blog_search_index.put(updated_post)
+    await collection_versions.bump(BLOG_POSTS_COLLECTION)
+    if existing_post.get("is_featured") or updated_post.is_featured:
+        await collection_versions.bump(FEATURED_ARTICLES_VERSION)
+    return updated_post
 
 @api_router.delete("/admin/blog/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_blog_post(
@@ -454,6 +3188,10 @@ async def delete_blog_post(
         raise HTTPException(status_code=404, detail="Blog post not found")
     
     await db[BLOG_POSTS_COLLECTION].delete_one({"id": post_id})
+    blog_search_index.remove(post_id)
+    await collection_versions.bump(BLOG_POSTS_COLLECTION)
+    if existing_post.get("is_featured"):
+        await collection_versions.bump(FEATURED_ARTICLES_VERSION)
     return None
 
 # Admin Routes - User Management
@@ -482,6 +3220,7 @@ async def update_user(
         {"id": user_id},
         {"$set": {"is_admin": is_admin}}
     )
+    await collection_versions.bump(USERS_COLLECTION)
     
     updated_user = await db[USERS_COLLECTION].find_one({"id": user_id})
     return User(**updated_user)
@@ -493,7 +3232,11 @@ async def admin_create_island(
     current_admin: User = Depends(get_current_admin)
 ):
     island = Island(**island_data.model_dump())
-    await db[ISLANDS_COLLECTION].insert_one(island.model_dump())
+    await db[ISLANDS_COLLECTION].insert_one(island.document())
+    island_catalog.put(island)
+    await island_catalog.changed()
+    if island.is_featured:
+        await collection_versions.bump(FEATURED_ISLANDS_VERSION)
     return island
 
 @api_router.put("/admin/islands/{island_id}", response_model=Island)
@@ -509,14 +3252,19 @@ async def admin_update_island(
     
     # Update the island
     update_data = island_data.model_dump()
+    update_data["location"] = geo_point(island_data.lat, island_data.lng)
     
     await db[ISLANDS_COLLECTION].update_one(
         {"id": island_id},
         {"$set": update_data}
     )
     
-    updated_island = await db[ISLANDS_COLLECTION].find_one({"id": island_id})
-    return Island(**updated_island)
+    updated_island = Island(**await db[ISLANDS_COLLECTION].find_one({"id": island_id}))
+    island_catalog.put(updated_island)
+    await island_catalog.changed()
+    if island.get("is_featured") or updated_island.is_featured:
+        await collection_versions.bump(FEATURED_ISLANDS_VERSION)
+    return updated_island
 
 @api_router.delete("/admin/islands/{island_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def admin_delete_island(
@@ -537,56 +3285,418 @@ async def admin_delete_island(
         )
     
     await db[ISLANDS_COLLECTION].delete_one({"id": island_id})
+    island_catalog.remove(island_id)
+    await island_catalog.changed()
+    if island.get("is_featured"):
+        await collection_versions.bump(FEATURED_ISLANDS_VERSION)
+    return None
+
+# Admin Routes - Bulk Island Import/Export
+# Rows are matched on `id` when present (as in our own exports), otherwise on
+# (atoll, name), and upserted in unordered bulk_write batches. The body is
+# parsed as it streams in, so memory stays bounded by one batch.
+ISLAND_IMPORT_BATCH_SIZE = int(os.environ.get("ISLAND_IMPORT_BATCH_SIZE", "500"))
+ISLAND_IMPORT_MAX_ERRORS = 1000
+ISLAND_CSV_COLUMNS = ["id", *IslandCreate.model_fields]
+
+async def stream_lines(chunks: AsyncIterator[bytes]):
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+def island_from_csv(row: Dict[str, str]) -> Dict[str, Any]:
+    # Empty cells fall back to model defaults; tags are "|"-separated and
+    # photos are a JSON array, matching the CSV export
+    fields: Dict[str, Any] = {key: value for key, value in row.items() if key and value not in (None, "")}
+    if "tags" in fields:
+        fields["tags"] = [tag.strip() for tag in fields["tags"].split("|") if tag.strip()]
+    if "photos" in fields:
+        fields["photos"] = json.loads(fields["photos"])
+    return fields
+
+def island_to_csv(island: Island) -> List[Any]:
+    row = island.model_dump(include=set(ISLAND_CSV_COLUMNS))
+    row["tags"] = "|".join(island.tags)
+    row["photos"] = json.dumps(island.photos) if island.photos else ""
+    return [row[column] if row[column] is not None else "" for column in ISLAND_CSV_COLUMNS]
+
+async def island_import_rows(chunks: AsyncIterator[bytes], format: str):
+    # Yields (line number, raw fields or the reason the row could not be read)
+    header = None
+    record, record_line = "", 0
+    line_number = 0
+    async for raw in stream_lines(chunks):
+        line_number += 1
+        try:
+            line = raw.decode("utf-8").rstrip("\r")
+        except UnicodeDecodeError:
+            yield line_number, "Line is not valid UTF-8"
+            continue
+        if line_number == 1:
+            line = line.lstrip("\ufeff")
+        
+        if format == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                fields = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            yield line_number, fields if isinstance(fields, dict) else "Expected a JSON object"
+            continue
+        
+        # CSV: a quoted cell may contain newlines, so keep reading until the
+        # quotes balance
+        if not record:
+            record_line = line_number
+        record = f"{record}\n{line}" if record else line
+        if record.count('"') % 2:
+            continue
+        record, text = "", record
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [column.strip() for column in values]
+            continue
+        if len(values) != len(header):
+            yield record_line, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        try:
+            yield record_line, island_from_csv(dict(zip(header, values)))
+        except ValueError as e:
+            yield record_line, f"Invalid photos JSON: {e}"
+    if record:
+        yield record_line, "Unterminated quoted field"
+
+def validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}" for err in e.errors())
+
+async def flush_island_import(batch: Dict[Any, Tuple[int, UpdateOne]], result: IslandImportResult):
+    lines = [line for line, _ in batch.values()]
+    try:
+        write = await db[ISLANDS_COLLECTION].bulk_write([op for _, op in batch.values()], ordered=False)
+        upserted, matched, modified, write_errors = write.upserted_count, write.matched_count, write.modified_count, []
+    except BulkWriteError as e:
+        details = e.details
+        upserted, matched, modified = details["nUpserted"], details["nMatched"], details["nModified"]
+        write_errors = details["writeErrors"]
+    result.inserted += upserted
+    result.updated += modified
+    result.unchanged += matched - modified
+    for error in write_errors:
+        record_import_error(result, lines[error["index"]], error["errmsg"])
+    batch.clear()
+
+def record_import_error(result: IslandImportResult, line: int, error: str):
+    result.failed += 1
+    if len(result.errors) < ISLAND_IMPORT_MAX_ERRORS:
+        result.errors.append(IslandImportError(line=line, error=error))
+    else:
+        result.errors_truncated = True
+
+@api_router.post("/admin/islands/import", response_model=IslandImportResult)
+async def admin_import_islands(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_admin: User = Depends(get_current_admin)
+):
+    result = IslandImportResult()
+    # Keyed by match filter so a repeated row within a batch is written once,
+    # last one wins
+    batch: Dict[Any, Tuple[int, UpdateOne]] = {}
+    async for line, fields in island_import_rows(request.stream(), format):
+        result.processed += 1
+        if isinstance(fields, str):
+            record_import_error(result, line, fields)
+            continue
+        try:
+            island_id = fields.get("id")
+            if island_id is not None and not isinstance(island_id, str):
+                raise ValueError("id must be a string")
+            island = Island(**IslandCreate(**fields).model_dump())
+        except ValidationError as e:
+            record_import_error(result, line, validation_message(e))
+            continue
+        except ValueError as e:
+            record_import_error(result, line, str(e))
+            continue
+        
+        match = {"id": island_id} if island_id else {"atoll": island.atoll, "name": island.name}
+        on_insert: Dict[str, Any] = {"created_at": island.created_at}
+        if not island_id:
+            on_insert["id"] = island.id
+        batch[tuple(match.items())] = (line, UpdateOne(
+            match,
+            {"$set": {**island.model_dump(exclude={"id", "created_at"}), "location": island.location},
+             "$setOnInsert": on_insert},
+            upsert=True,
+        ))
+        if len(batch) >= ISLAND_IMPORT_BATCH_SIZE:
+            await flush_island_import(batch, result)
+    if batch:
+        await flush_island_import(batch, result)
+    
+    if result.inserted or result.updated:
+        await collection_versions.bump(ISLANDS_COLLECTION)
+        await collection_versions.bump(FEATURED_ISLANDS_VERSION)
+        await island_catalog.refresh()
+    logger.info(f"Island import: {result.processed} rows, {result.inserted} inserted, "
+                f"{result.updated} updated, {result.failed} failed")
+    return result
+
+@api_router.get("/admin/islands/export")
+async def admin_export_islands(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_admin: User = Depends(get_current_admin)
+):
+    # Streams straight off the Motor cursor, one row at a time
+    islands_cursor = db[ISLANDS_COLLECTION].find({}, {"_id": 0}).sort([("atoll", 1), ("name", 1)])
+    
+    async def stream_ndjson():
+        async for doc in islands_cursor:
+            yield Island(**doc).model_dump_json() + "\n"
+    
+    async def stream_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ISLAND_CSV_COLUMNS)
+        async for doc in islands_cursor:
+            writer.writerow(island_to_csv(Island(**doc)))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if format == "csv":
+        return StreamingResponse(stream_csv(), media_type="text/csv",
+                                 headers={"Content-Disposition": 'attachment; filename="islands.csv"'})
+    return StreamingResponse(stream_ndjson(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": 'attachment; filename="islands.ndjson"'})
+
+# API Routes - Leaderboards
+async def leaderboard_for(metric: str, atoll: Optional[str]) -> RankedBoard:
+    if metric not in LEADERBOARD_METRICS:
+        raise HTTPException(status_code=404, detail="Leaderboard not found")
+    if metric == "atolls" and atoll:
+        raise HTTPException(status_code=400, detail="Per-atoll leaderboards rank visits or islands")
+    await leaderboards.refresh()
+    return leaderboards.board(metric, atoll)
+
+@api_router.get("/leaderboards/{metric}", response_model=Leaderboard)
+async def get_leaderboard(
+    metric: str,
+    atoll: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+):
+    board = await leaderboard_for(metric, atoll)
+    top = board.top(limit)
+    usernames = {
+        doc["id"]: doc["username"]
+        async for doc in db[USERS_COLLECTION].find(
+            {"id": {"$in": [user_id for _, user_id, _ in top]}}, {"_id": 0, "id": 1, "username": 1}
+        )
+    }
+    return Leaderboard(
+        metric=metric,
+        atoll=atoll,
+        participants=len(board),
+        entries=[
+            LeaderboardEntry(rank=rank, user_id=user_id, username=usernames.get(user_id), score=score)
+            for rank, user_id, score in top
+        ],
+    )
+
+@api_router.get("/leaderboards/{metric}/me", response_model=LeaderboardRank)
+async def get_my_leaderboard_rank(
+    metric: str,
+    atoll: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    board = await leaderboard_for(metric, atoll)
+    rank, score = board.rank(current_user.id)
+    return LeaderboardRank(metric=metric, atoll=atoll, participants=len(board), rank=rank, score=score)
+
+# API Routes - Badges
+@api_router.get("/badges", response_model=List[Badge])
+async def get_badges():
+    return [rule.badge for rule in await badge_engine.rules()]
+
+@api_router.get("/badges/me", response_model=List[BadgeProgress])
+async def get_my_badges(current_user: User = Depends(get_current_user)):
+    return await badge_engine.progress(await with_fresh_counters(current_user))
+
+@api_router.post("/admin/badges", response_model=Badge)
+async def admin_create_badge(
+    badge_data: BadgeCreate,
+    current_admin: User = Depends(get_current_admin)
+):
+    badge = Badge(**badge_data.model_dump(exclude_none=True))
+    await db[BADGES_COLLECTION].insert_one(badge.model_dump())
+    await collection_versions.bump(BADGES_COLLECTION)
+    # Award it to everyone who already qualifies
+    badge_engine.schedule_reevaluate([badge.id])
+    return badge
+
+@api_router.put("/admin/badges/{badge_id}", response_model=Badge)
+async def admin_update_badge(
+    badge_id: str,
+    badge_data: BadgeCreate,
+    current_admin: User = Depends(get_current_admin)
+):
+    result = await db[BADGES_COLLECTION].update_one(
+        {"id": badge_id},
+        {"$set": badge_data.model_dump(exclude_none=True)}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Badge not found")
+    await collection_versions.bump(BADGES_COLLECTION)
+    badge_engine.schedule_reevaluate([badge_id])
+    return Badge(**await db[BADGES_COLLECTION].find_one({"id": badge_id}))
+
+@api_router.delete("/admin/badges/{badge_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def admin_delete_badge(
+    badge_id: str,
+    current_admin: User = Depends(get_current_admin)
+):
+    result = await db[BADGES_COLLECTION].delete_one({"id": badge_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Badge not found")
+    await db[BADGE_PROGRESS_COLLECTION].delete_many({"badge_id": badge_id})
+    await db[USERS_COLLECTION].update_many({"badges": badge_id}, {"$pull": {"badges": badge_id}})
+    await collection_versions.bump(BADGES_COLLECTION)
     return None
 
+@api_router.post("/admin/badges/reevaluate", status_code=status.HTTP_202_ACCEPTED)
+async def admin_reevaluate_badges(
+    badge_id: Optional[str] = None,
+    current_admin: User = Depends(get_current_admin)
+):
+    # Runs in the background; progress is logged and shown in /admin/cache/stats
+    badge_engine.schedule_reevaluate([badge_id] if badge_id else None)
+    return {"scheduled": badge_id or "all"}
+
 # Routes for Featured Islands
 @api_router.get("/featured/islands", response_model=List[Island])
 async def get_featured_islands():
-    featured_islands = await db[ISLANDS_COLLECTION].find(
-        {"is_featured": True}
-    ).sort("featured_order", 1).to_list(10)  # Limit to 10 featured islands
+    async def render() -> bytes:
+        # Read from Mongo rather than the catalog: the result is cached until
+        # the next featured bump, so it must not be rendered from a worker's
+        # catalog that hasn't caught up with that bump yet
+        featured_islands = await db[ISLANDS_COLLECTION].find(
+            {"is_featured": True}, {"_id": 0}
+        ).sort("featured_order", 1).to_list(10)  # Limit to 10 featured islands
+        return island_list_adapter.dump_json([Island(**island) for island in featured_islands])
     
-    return [Island(**island) for island in featured_islands]
+    body = await rendered_cache.get(FEATURED_ISLANDS_VERSION, render)
+    return Response(content=body, media_type="application/json")
 
 # Routes for Featured Articles
 @api_router.get("/featured/articles", response_model=List[BlogPost])
 async def get_featured_articles():
-    featured_articles = await db[BLOG_POSTS_COLLECTION].find(
-        {"is_featured": True, "is_published": True}
-    ).sort("featured_order", 1).to_list(8)  # Limit to 8 featured articles
+    async def render() -> bytes:
+        featured_articles = await db[BLOG_POSTS_COLLECTION].find(
+            {"is_featured": True, "is_published": True}, {"_id": 0}
+        ).sort("featured_order", 1).to_list(8)  # Limit to 8 featured articles
+        return blog_post_list_adapter.dump_json([BlogPost(**article) for article in featured_articles])
     
-    return [BlogPost(**article) for article in featured_articles]
+    body = await rendered_cache.get(FEATURED_ARTICLES_VERSION, render)
+    return Response(content=body, media_type="application/json")
 
 # Ad Space Management API Routes
 @api_router.get("/ads", response_model=List[Ad])
 async def get_ads(placement: Optional[str] = None):
-    query = {}
-    
-    # Filter by placement if specified
-    if placement:
-        query["placement"] = placement
-    
-    # Only show active ads within their date range
-    now = datetime.utcnow()
-    query["is_active"] = True
-    query["$or"] = [
-        {"start_date": {"$lte": now}, "end_date": {"$gte": now}},
-        {"start_date": {"$lte": now}, "end_date": None},
-        {"start_date": None, "end_date": {"$gte": now}},
-        {"start_date": None, "end_date": None}
-    ]
-    
-    ads = await db[ADS_COLLECTION].find(query).to_list(100)
-    return [Ad(**ad) for ad in ads]
+    # Only active ads within their date range, served pre-serialized
+    body = await ad_index.live_json(placement or None)
+    return Response(content=body, media_type="application/json")
+
+@api_router.get("/ads/select", response_model=List[Ad])
+async def select_ads(
+    placement: str,
+    n: int = Query(1, ge=1, le=10),
+    visitor_id: Optional[str] = None,
+    current_user: Optional[User] = Depends(get_optional_user)
+):
+    # Signed-in users are capped by account; anonymous visitors by the
+    # client-generated visitor id, if any
+    visitor = current_user.id if current_user else visitor_id
+    chosen = ad_rotation.select(await ad_index.live(placement), n, visitor)
+    return Response(content=ad_list_adapter.dump_json(chosen), media_type="application/json")
 
 @api_router.get("/ads/{ad_id}", response_model=Ad)
 async def get_ad(ad_id: str):
-    ad = await db[ADS_COLLECTION].find_one({"id": ad_id})
+    ad = await ad_index.get(ad_id)
+    if not ad:
+        raise HTTPException(status_code=404, detail="Ad not found")
+    return ad
+
+@api_router.post("/ads/{ad_id}/impression", status_code=status.HTTP_204_NO_CONTENT)
+async def record_ad_impression(ad_id: str):
+    ad = await ad_index.get(ad_id)
     if not ad:
         raise HTTPException(status_code=404, detail="Ad not found")
-    return Ad(**ad)
+    ad_events.record(ad, "impressions")
+    return None
+
+@api_router.post("/ads/{ad_id}/click", status_code=status.HTTP_204_NO_CONTENT)
+async def record_ad_click(ad_id: str):
+    ad = await ad_index.get(ad_id)
+    if not ad:
+        raise HTTPException(status_code=404, detail="Ad not found")
+    ad_events.record(ad, "clicks")
+    return None
 
 # Admin Ad Management Routes
+@api_router.get("/admin/ads/stats")
+async def admin_get_ad_stats(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_admin: User = Depends(get_current_admin)
+):
+    match: Dict[str, Any] = {}
+    if since or until:
+        match["bucket"] = {}
+        if since:
+            match["bucket"]["$gte"] = as_naive_utc(since)
+        if until:
+            match["bucket"]["$lt"] = as_naive_utc(until)
+    
+    rows = await db[AD_STATS_COLLECTION].aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"ad_id": "$ad_id", "placement": "$placement"},
+            "impressions": {"$sum": "$impressions"},
+            "clicks": {"$sum": "$clicks"},
+        }},
+    ]).to_list(None)
+    
+    ads = []
+    placements: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        ad = await ad_index.get(row["_id"]["ad_id"])
+        placement = row["_id"]["placement"]
+        ads.append({
+            "ad_id": row["_id"]["ad_id"],
+            "name": ad.name if ad else None,
+            "placement": placement,
+            "impressions": row["impressions"],
+            "clicks": row["clicks"],
+            "ctr": row["clicks"] / row["impressions"] if row["impressions"] else None,
+        })
+        totals = placements.setdefault(placement, {"placement": placement, "impressions": 0, "clicks": 0})
+        totals["impressions"] += row["impressions"]
+        totals["clicks"] += row["clicks"]
+    for totals in placements.values():
+        totals["ctr"] = totals["clicks"] / totals["impressions"] if totals["impressions"] else None
+    
+    ads.sort(key=lambda entry: entry["impressions"], reverse=True)
+    return {"ads": ads, "placements": list(placements.values()), "buffer": ad_events.stats()}
+
 @api_router.get("/admin/ads", response_model=List[Ad])
 async def admin_get_ads(
     current_admin: User = Depends(get_current_admin)
@@ -601,6 +3711,8 @@ async def admin_create_ad(
 ):
     ad = Ad(**ad_data.model_dump())
     await db[ADS_COLLECTION].insert_one(ad.model_dump())
+    ad_index.put(ad)
+    await ad_index.changed()
     return ad
 
 @api_router.put("/admin/ads/{ad_id}", response_model=Ad)
@@ -623,8 +3735,10 @@ async def admin_update_ad(
         {"$set": update_data}
     )
     
-    updated_ad = await db[ADS_COLLECTION].find_one({"id": ad_id})
-    return Ad(**updated_ad)
+    updated_ad = Ad(**await db[ADS_COLLECTION].find_one({"id": ad_id}))
+    ad_index.put(updated_ad)
+    await ad_index.changed()
+    return updated_ad
 
 @api_router.delete("/admin/ads/{ad_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def admin_delete_ad(
@@ -637,11 +3751,335 @@ async def admin_delete_ad(
         raise HTTPException(status_code=404, detail="Ad not found")
     
     await db[ADS_COLLECTION].delete_one({"id": ad_id})
+    ad_index.remove(ad_id)
+    await ad_index.changed()
     return None
 
+# Admin Routes - Analytics
+# Each report is one aggregation over the daily visit rollups in the chosen
+# window; island names and atolls are joined from the in-memory catalog
+ANALYTICS_RANGES = {"week": 7, "month": 30, "year": 365}
+
+def analytics_window(time_range: str) -> Tuple[datetime, datetime]:
+    end = datetime.utcnow()
+    start = (end - timedelta(days=ANALYTICS_RANGES[time_range] - 1)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return start, end
+
+async def cached_analytics(key: tuple, compute):
+    # Keyed by the rollups version too, so a rebuild retires every entry
+    key = (collection_versions.get(ROLLUPS_VERSION), *key)
+    result = analytics_cache.get(key)
+    if result is None:
+        result = await compute()
+        analytics_cache.set(key, result)
+    return result
+
+def rollup_date_range(start: datetime, end: datetime) -> Dict[str, str]:
+    return {"$gte": visit_day(start), "$lte": visit_day(end)}
+
+async def visits_per_island(start: datetime, end: datetime) -> Dict[str, int]:
+    rows = await db[ROLLUP_ISLAND_DAILY_COLLECTION].aggregate([
+        {"$match": {"date": rollup_date_range(start, end)}},
+        {"$group": {"_id": "$island_id", "visits": {"$sum": "$visits"}}},
+    ]).to_list(None)
+    return {row["_id"]: row["visits"] for row in rows}
+
+@api_router.get("/admin/analytics/visits-per-day")
+async def get_visits_per_day(
+    time_range: str = Query("month", alias="range", pattern="^(week|month|year)$"),
+    current_admin: User = Depends(get_current_admin)
+):
+    async def compute():
+        start, end = analytics_window(time_range)
+        rows = await db[ROLLUP_ATOLL_DAILY_COLLECTION].aggregate([
+            {"$match": {"date": rollup_date_range(start, end)}},
+            {"$group": {"_id": "$date", "visits": {"$sum": "$visits"}}},
+        ]).to_list(None)
+        counts = {row["_id"]: row["visits"] for row in rows}
+        
+        # Zero-fill days without visits so the series is continuous
+        days = []
+        day = start
+        while day <= end:
+            date = day.strftime("%Y-%m-%d")
+            days.append({"date": date, "visits": counts.get(date, 0)})
+            day += timedelta(days=1)
+        return {"range": time_range, "total": sum(counts.values()), "days": days}
+    
+    return await cached_analytics(("visits-per-day", time_range), compute)
+
+@api_router.get("/admin/analytics/top-islands")
+async def get_top_islands(
+    time_range: str = Query("month", alias="range", pattern="^(week|month|year)$"),
+    limit: int = Query(5, ge=1, le=100),
+    current_admin: User = Depends(get_current_admin)
+):
+    async def compute():
+        counts = await visits_per_island(*analytics_window(time_range))
+        top = []
+        for island_id, visits in sorted(counts.items(), key=lambda item: item[1], reverse=True):
+            island = await island_catalog.get(island_id)
+            if island:
+                top.append({"id": island.id, "name": island.name, "atoll": island.atoll,
+                            "type": island.type, "visits": visits})
+            if len(top) == limit:
+                break
+        return {"range": time_range, "islands": top}
+    
+    return await cached_analytics(("top-islands", time_range, limit), compute)
+
+@api_router.get("/admin/analytics/top-atolls")
+async def get_top_atolls(
+    time_range: str = Query("month", alias="range", pattern="^(week|month|year)$"),
+    limit: int = Query(5, ge=1, le=100),
+    current_admin: User = Depends(get_current_admin)
+):
+    async def compute():
+        start, end = analytics_window(time_range)
+        rows = await db[ROLLUP_ATOLL_DAILY_COLLECTION].aggregate([
+            {"$match": {"date": rollup_date_range(start, end)}},
+            {"$group": {"_id": "$atoll", "visits": {"$sum": "$visits"}}},
+        ]).to_list(None)
+        await island_catalog.all()
+        atolls = {
+            entry["atoll"]: {"name": entry["atoll"], "islands": entry["count"], "visits": 0}
+            for entry in island_catalog.atolls()
+        }
+        for row in rows:
+            if row["_id"] in atolls:
+                atolls[row["_id"]]["visits"] = row["visits"]
+        top = sorted(atolls.values(), key=lambda atoll: atoll["visits"], reverse=True)[:limit]
+        return {"range": time_range, "atolls": top}
+    
+    return await cached_analytics(("top-atolls", time_range, limit), compute)
+
+@api_router.get("/admin/analytics/user-growth")
+async def get_user_growth(
+    time_range: str = Query("year", alias="range", pattern="^(week|month|year)$"),
+    current_admin: User = Depends(get_current_admin)
+):
+    async def compute():
+        start, end = analytics_window(time_range)
+        # Monthly buckets for a year, daily buckets otherwise
+        period_format = "%Y-%m" if time_range == "year" else "%Y-%m-%d"
+        rows = await db[USERS_COLLECTION].aggregate([
+            {"$match": {"created_at": {"$gte": start, "$lte": end}}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": period_format, "date": "$created_at"}},
+                "users": {"$sum": 1},
+            }},
+            {"$sort": {"_id": 1}},
+        ]).to_list(None)
+        total = await db[USERS_COLLECTION].count_documents({"created_at": {"$lt": start}})
+        periods = []
+        for row in rows:
+            total += row["users"]
+            periods.append({"period": row["_id"], "users": row["users"], "total_users": total})
+        return {"range": time_range, "periods": periods}
+    
+    return await cached_analytics(("user-growth", time_range), compute)
+
+# Admin Routes - Cache Statistics
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats(current_admin: User = Depends(get_current_admin)):
+    return {
+        "islands": island_catalog.stats(),
+        "principals": principal_cache.stats(),
+        "analytics": analytics_cache.stats(),
+        "ads": ad_index.stats(),
+        "ad_rotation": ad_rotation.stats(),
+        "rendered": rendered_cache.stats(),
+        "badges": badge_engine.stats(),
+        "leaderboards": leaderboards.stats(),
+    }
+
+@api_router.get("/admin/stats/password-hashing")
+async def get_password_hashing_stats(current_admin: User = Depends(get_current_admin)):
+    return password_hasher.stats()
+
+# Index management
+# Every index the API relies on, with the route queries it serves.
+# ensure_indexes() builds them at startup (create_index is a no-op when the
+# index already exists) and `python server.py --check-indexes` explains each
+# route query below and fails if any of them falls back to a collection scan.
+class IndexSpec(BaseModel):
+    collection: str
+    keys: List[Tuple[str, Any]]
+    unique: bool = False
+    partial: Optional[Dict[str, Any]] = None
+    serves: List[str]
+
+class QueryCheck(BaseModel):
+    route: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: List[Tuple[str, int]] = []
+
+INDEX_SPECS = [
+    IndexSpec(collection=USERS_COLLECTION, keys=[("email", 1)], unique=True,
+              serves=["POST /register", "POST /login"]),
+    IndexSpec(collection=USERS_COLLECTION, keys=[("id", 1)], unique=True,
+              serves=["get_current_user", "PUT /admin/users/{user_id}", "POST /visits"]),
+    IndexSpec(collection=ISLANDS_COLLECTION, keys=[("id", 1)], unique=True,
+              serves=["island catalog misses", "PUT/DELETE /admin/islands/{island_id}"]),
+    IndexSpec(collection=ISLANDS_COLLECTION, keys=[("atoll", 1), ("name", 1)],
+              serves=["POST /admin/islands/import", "GET /admin/islands/export"]),
+    IndexSpec(collection=ISLANDS_COLLECTION, keys=[("type", 1)],
+              serves=["GET /islands/nearest?type="]),
+    IndexSpec(collection=ISLANDS_COLLECTION, keys=[("is_featured", 1), ("featured_order", 1)],
+              serves=["GET /featured/islands"]),
+    IndexSpec(collection=ISLANDS_COLLECTION, keys=[("location", "2dsphere")],
+              serves=["GET /islands/viewport", "GET /islands/nearest"]),
+    IndexSpec(collection=VISITS_COLLECTION, keys=[("user_id", 1), ("visit_date", -1), ("id", -1)],
+              serves=["GET /visits/user", "GET /islands/visited"]),
+    IndexSpec(collection=VISITS_COLLECTION, keys=[("user_id", 1), ("island_id", 1), ("visit_date", -1), ("id", -1)],
+              serves=["GET /visits/user?island_id="]),
+    IndexSpec(collection=USERS_COLLECTION, keys=[("created_at", 1)],
+              serves=["GET /admin/analytics/user-growth"]),
+    IndexSpec(collection=ROLLUP_ISLAND_DAILY_COLLECTION, keys=[("date", 1)],
+              serves=["GET /admin/analytics/top-islands"]),
+    IndexSpec(collection=ROLLUP_ATOLL_DAILY_COLLECTION, keys=[("date", 1)],
+              serves=["GET /admin/analytics/visits-per-day", "GET /admin/analytics/top-atolls"]),
+    IndexSpec(collection=ROLLUP_USERS_COLLECTION, keys=[("updated_at", 1)],
+              serves=["leaderboard sync"]),
+    IndexSpec(collection=ROLLUP_USER_ATOLLS_COLLECTION, keys=[("user_id", 1)],
+              serves=["leaderboard sync"]),
+    IndexSpec(collection=ROLLUP_USER_ISLANDS_COLLECTION, keys=[("user_id", 1)],
+              serves=["leaderboard sync"]),
+    IndexSpec(collection=VISITS_COLLECTION, keys=[("user_id", 1), ("client_id", 1)], unique=True,
+              partial={"client_id": {"$type": "string"}},
+              serves=["POST /visits/batch"]),
+    IndexSpec(collection=BADGES_COLLECTION, keys=[("id", 1)], unique=True,
+              serves=["PUT/DELETE /admin/badges/{badge_id}"]),
+    IndexSpec(collection=BADGE_PROGRESS_COLLECTION, keys=[("user_id", 1)],
+              serves=["GET /badges/me"]),
+    IndexSpec(collection=BADGE_PROGRESS_COLLECTION, keys=[("badge_id", 1)],
+              serves=["POST /admin/badges/reevaluate", "DELETE /admin/badges/{badge_id}"]),
+    IndexSpec(collection=VISITS_COLLECTION, keys=[("island_id", 1)],
+              serves=["DELETE /admin/islands/{island_id}"]),
+    IndexSpec(collection=BLOG_POSTS_COLLECTION, keys=[("slug", 1)], unique=True,
+              serves=["GET /blog/{slug}", "POST /admin/blog", "PUT /admin/blog/{post_id}"]),
+    IndexSpec(collection=BLOG_POSTS_COLLECTION, keys=[("id", 1)], unique=True,
+              serves=["PUT/DELETE /admin/blog/{post_id}"]),
+    IndexSpec(collection=BLOG_POSTS_COLLECTION, keys=[("is_published", 1), ("published_date", -1), ("id", -1)],
+              serves=["GET /blog"]),
+    IndexSpec(collection=BLOG_POSTS_COLLECTION, keys=[("tags", 1), ("is_published", 1), ("published_date", -1), ("id", -1)],
+              serves=["GET /blog?tag="]),
+    IndexSpec(collection=BLOG_POSTS_COLLECTION, keys=[("published_date", -1), ("id", -1)],
+              serves=["GET /blog?published_only=false"]),
+    IndexSpec(collection=BLOG_POSTS_COLLECTION, keys=[("is_featured", 1), ("is_published", 1), ("featured_order", 1)],
+              serves=["GET /featured/articles"]),
+    IndexSpec(collection=ADS_COLLECTION, keys=[("id", 1)], unique=True,
+              serves=["PUT/DELETE /admin/ads/{ad_id}"]),
+    IndexSpec(collection=AD_STATS_COLLECTION, keys=[("bucket", 1)],
+              serves=["GET /admin/ads/stats?since=&until="]),
+]
+
+# Representative filters for every indexed route query. Full listings
+# (GET /admin/users, GET /admin/ads, the island catalog and ad index loads)
+# scan by design.
+def route_query_checks() -> List[QueryCheck]:
+    now = datetime.utcnow()
+    return [
+        QueryCheck(route="POST /login", collection=USERS_COLLECTION, filter={"email": "check@example.com"}),
+        QueryCheck(route="get_current_user", collection=USERS_COLLECTION, filter={"id": "check"}),
+        QueryCheck(route="GET /islands/{island_id}", collection=ISLANDS_COLLECTION, filter={"id": "check"}),
+        QueryCheck(route="GET /featured/islands", collection=ISLANDS_COLLECTION,
+                   filter={"is_featured": True}, sort=[("featured_order", 1)]),
+        QueryCheck(route="GET /badges/me", collection=BADGE_PROGRESS_COLLECTION, filter={"user_id": "check"}),
+        QueryCheck(route="POST /admin/badges/reevaluate", collection=VISITS_COLLECTION,
+                   filter={}, sort=[("user_id", 1)]),
+        QueryCheck(route="POST /visits/batch", collection=VISITS_COLLECTION,
+                   filter={"user_id": "check", "client_id": {"$in": ["a", "b"]}}),
+        QueryCheck(route="POST /admin/islands/import", collection=ISLANDS_COLLECTION,
+                   filter={"atoll": "Kaafu", "name": "check"}),
+        QueryCheck(route="GET /admin/islands/export", collection=ISLANDS_COLLECTION,
+                   filter={}, sort=[("atoll", 1), ("name", 1)]),
+        QueryCheck(route="GET /islands/viewport", collection=ISLANDS_COLLECTION, filter={"location": {"$geoWithin": {"$geometry": {
+            "type": "Polygon", "coordinates": [[[72, 3], [74, 3], [74, 5], [72, 5], [72, 3]]],
+        }}}}),
+        QueryCheck(route="GET /visits/user", collection=VISITS_COLLECTION,
+                   filter={"user_id": "check"}, sort=[("visit_date", -1), ("id", -1)]),
+        QueryCheck(route="GET /visits/user?island_id=", collection=VISITS_COLLECTION,
+                   filter={"user_id": "check", "island_id": "check"}, sort=[("visit_date", -1), ("id", -1)]),
+        QueryCheck(route="DELETE /admin/islands/{island_id}", collection=VISITS_COLLECTION, filter={"island_id": "check"}),
+        QueryCheck(route="GET /admin/analytics/top-islands", collection=ROLLUP_ISLAND_DAILY_COLLECTION,
+                   filter={"date": rollup_date_range(now - timedelta(days=30), now)}),
+        QueryCheck(route="GET /admin/analytics/visits-per-day", collection=ROLLUP_ATOLL_DAILY_COLLECTION,
+                   filter={"date": rollup_date_range(now - timedelta(days=30), now)}),
+        QueryCheck(route="leaderboard sync", collection=ROLLUP_USERS_COLLECTION,
+                   filter={"updated_at": {"$gte": now - timedelta(seconds=LEADERBOARD_SYNC_OVERLAP_SECONDS)}}),
+        QueryCheck(route="leaderboard sync", collection=ROLLUP_USER_ATOLLS_COLLECTION,
+                   filter={"user_id": {"$in": ["check"]}}),
+        QueryCheck(route="leaderboard sync", collection=ROLLUP_USER_ISLANDS_COLLECTION,
+                   filter={"user_id": {"$in": ["check"]}}),
+        QueryCheck(route="GET /admin/analytics/user-growth", collection=USERS_COLLECTION,
+                   filter={"created_at": {"$gte": now - timedelta(days=365), "$lte": now}}),
+        QueryCheck(route="GET /blog/{slug}", collection=BLOG_POSTS_COLLECTION, filter={"slug": "check"}),
+        QueryCheck(route="PUT /admin/blog/{post_id}", collection=BLOG_POSTS_COLLECTION, filter={"id": "check"}),
+        QueryCheck(route="GET /blog", collection=BLOG_POSTS_COLLECTION,
+                   filter={"is_published": True}, sort=[("published_date", -1), ("id", -1)]),
+        QueryCheck(route="GET /blog?tag=", collection=BLOG_POSTS_COLLECTION,
+                   filter={"is_published": True, "tags": "check"}, sort=[("published_date", -1), ("id", -1)]),
+        QueryCheck(route="GET /blog?published_only=false", collection=BLOG_POSTS_COLLECTION,
+                   filter={}, sort=[("published_date", -1), ("id", -1)]),
+        QueryCheck(route="GET /featured/articles", collection=BLOG_POSTS_COLLECTION,
+                   filter={"is_featured": True, "is_published": True}, sort=[("featured_order", 1)]),
+        QueryCheck(route="PUT /admin/ads/{ad_id}", collection=ADS_COLLECTION, filter={"id": "check"}),
+        QueryCheck(route="GET /admin/ads/stats", collection=AD_STATS_COLLECTION,
+                   filter={"bucket": {"$gte": now - timedelta(days=7)}}),
+    ]
+
+async def ensure_indexes():
+    for spec in INDEX_SPECS:
+        try:
+            options: Dict[str, Any] = {"partialFilterExpression": spec.partial} if spec.partial else {}
+            name = await db[spec.collection].create_index(spec.keys, unique=spec.unique, **options)
+        except OperationFailure as e:
+            # Existing duplicates or a conflicting index definition; keep
+            # serving and let the operator fix the data
+            logger.error(f"Could not build index {spec.collection} {spec.keys}: {e}")
+            continue
+        unique = " (unique)" if spec.unique else ""
+        logger.info(f"Index {spec.collection}.{name}{unique} serves: {', '.join(spec.serves)}")
+
+def plan_stages(plan: Any) -> List[str]:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+async def check_indexes() -> bool:
+    await ensure_indexes()
+    ok = True
+    for check in route_query_checks():
+        cursor = db[check.collection].find(check.filter)
+        if check.sort:
+            cursor = cursor.sort(check.sort)
+        explanation = await cursor.explain()
+        stages = plan_stages(explanation["queryPlanner"]["winningPlan"])
+        if "COLLSCAN" in stages:
+            ok = False
+            logger.error(f"COLLSCAN: {check.route} on {check.collection} {check.filter}")
+        else:
+            logger.info(f"OK: {check.route} -> {' <- '.join(stages)}")
+    return ok
+
 # Initialize the Maldives islands data if the collection is empty
 @app.on_event("startup")
 async def initialize_data():
+    await ensure_indexes()
+    await collection_versions.load()
+    collection_versions.start()
+    
     # Check if islands collection is empty
     island_count = await db[ISLANDS_COLLECTION].count_documents({})
     
@@ -795,11 +4233,130 @@ async def initialize_data():
         ]
         
         # Insert the sample islands
-        for island_data in sample_islands:
-            island = Island(**island_data)
-            await db[ISLANDS_COLLECTION].insert_one(island.model_dump())
+        await db[ISLANDS_COLLECTION].insert_many([Island(**island_data).document() for island_data in sample_islands])
         
         logging.info(f"Initialized {len(sample_islands)} sample islands")
+    
+    # Starter badges, matching the ones the dashboard used to compute itself
+    if await db[BADGES_COLLECTION].count_documents({}) == 0:
+        starter_badges = [
+            {"name": "Island Explorer", "description": "Visited 10+ islands", "icon": "🏝️",
+             "criteria": {"metric": "islands", "min": 10}},
+            {"name": "Resort Connoisseur", "description": "Visited 5+ resort islands", "icon": "🏖️",
+             "criteria": {"metric": "islands", "type": "resort", "min": 5}},
+            {"name": "Local Explorer", "description": "Visited 5+ inhabited islands", "icon": "🏘️",
+             "criteria": {"metric": "islands", "type": "inhabited", "min": 5}},
+            {"name": "Atoll Hopper", "description": "Visited islands in 3+ different atolls", "icon": "🧭",
+             "criteria": {"metric": "atolls", "min": 3}},
+        ]
+        await db[BADGES_COLLECTION].insert_many([Badge(**badge).model_dump() for badge in starter_badges])
+        logging.info(f"Initialized {len(starter_badges)} starter badges")
+    
+    # Backfill GeoJSON locations for islands stored before the field existed
+    await db[ISLANDS_COLLECTION].update_many(
+        {"location": {"$exists": False}},
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$lng", "$lat"]}}}]
+    )
+    
+    await island_catalog.load()
+    await ad_index.load()
+    await blog_search_index.load()
+    await badge_engine.load()
+    await leaderboards.load()
+    ad_events.start()
+    event_loop_monitor.start()
+    if ISLAND_CATALOG_WATCH:
+        island_catalog.start_watching()
+    
+    if await rollup_backfill.needed():
+        rollup_backfill.start()
+
+# HTTP caching for public reads
+# Strong ETags come from the shared collection versions (or, for ads, a hash
+# of the live body), so If-None-Match is answered with a 304 before the route
+# runs. Cache-Control lets browsers, a CDN or nginx absorb repeat reads.
+async def collection_etag_token(collection: str, request: Request) -> str:
+    return f"{collection}.{collection_versions.get(collection)}"
+
+async def ads_etag_token(request: Request) -> str:
+    return f"ads.{await ad_index.live_etag(request.query_params.get('placement') or None)}"
+
+HTTP_CACHE_POLICIES = [
+    # (path pattern, ETag token, Cache-Control)
+    (re.compile(r"^/api/featured/islands$"), lambda r: collection_etag_token(FEATURED_ISLANDS_VERSION, r),
+     "public, max-age=60, stale-while-revalidate=600"),
+    (re.compile(r"^/api/featured/articles$"), lambda r: collection_etag_token(FEATURED_ARTICLES_VERSION, r),
+     "public, max-age=60, stale-while-revalidate=600"),
+    # Admin screens list islands and posts through these same URLs, so they
+    # are revalidated on every read and an admin sees their own write at once.
+    # /islands/visited is per user and must never be shared.
+    (re.compile(r"^/api/islands(/(?!visited$)[^/]+)?$"), lambda r: collection_etag_token(ISLANDS_COLLECTION, r),
+     "public, no-cache"),
+    (re.compile(r"^/api/blog(/[^/]+)?$"), lambda r: collection_etag_token(BLOG_POSTS_COLLECTION, r),
+     "public, no-cache"),
+    (re.compile(r"^/api/ads$"), ads_etag_token,
+     "public, max-age=30, stale-while-revalidate=60"),
+]
+
+# For authenticated requests and listings that include drafts; a route can
+# also send it itself, and a Cache-Control set by the route is kept
+PRIVATE_CACHE_CONTROL = "private, no-store"
+
+def includes_private_content(request: Request) -> bool:
+    return ("authorization" in request.headers
+            or request.query_params.get("published_only", "").lower() in ("false", "0", "no", "off"))
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+class HTTPCacheMiddleware:
+    # Plain ASGI like MetricsMiddleware: requests without a policy pass
+    # straight through, and the rest only get their response start rewritten
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        policy = next((policy for policy in HTTP_CACHE_POLICIES if policy[0].match(scope["path"])), None)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
+        _, etag_token, cache_control = policy
+        if includes_private_content(request):
+            cache_control = PRIVATE_CACHE_CONTROL
+        # The token is taken before the route runs, so a concurrent write can only
+        # make the ETag older than the body, never newer
+        variant = hashlib.blake2b(f"{request.url.path}?{request.url.query}".encode(), digest_size=6).hexdigest()
+        etag = f'"{await etag_token(request)}.{variant}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control}
+        
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            # Routing never runs for a 304, so resolve the template for /metrics
+            scope["route"] = next(
+                (route for route in app.router.routes if route.matches(scope)[0] == Match.FULL), None)
+            response = Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            await response(scope, receive, send)
+            return
+        
+        async def send_with_cache_headers(message):
+            if message["type"] == "http.response.start" and message["status"] == status.HTTP_200_OK:
+                headers = [header for header in message.get("headers", []) if header[0].lower() != b"etag"]
+                headers.append((b"etag", etag.encode()))
+                if not any(header[0].lower() == b"cache-control" for header in headers):
+                    headers.append((b"cache-control", cache_control.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+        
+        await self.app(scope, receive, send_with_cache_headers)
+
+app.add_middleware(HTTPCacheMiddleware)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -810,8 +4367,19 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Next-Cursor", "ETag"],
 )
 
+if REQUEST_TRACING:
+    app.add_middleware(TracingMiddleware)
+
+# Outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -821,4 +4389,37 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await island_catalog.stop_watching()
+    await ad_events.stop()
+    await collection_versions.stop()
+    await event_loop_monitor.stop()
+    await rollup_backfill.stop()
+    await badge_engine.stop()
+    password_hasher.shutdown()
     client.close()
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="Maldives Island Tracker API maintenance")
+    parser.add_argument("--check-indexes", action="store_true",
+                        help="build indexes and fail if any route query does a COLLSCAN")
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="recompute the visit rollups from the visits collection "
+                             "(visits written while it runs are replayed before the swap)")
+    parser.add_argument("--reevaluate-badges", action="store_true",
+                        help="recompute badge progress from the visits collection and award any missing badges")
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="visits per batch for --rebuild-rollups and --reevaluate-badges")
+    args = parser.parse_args()
+    
+    if args.check_indexes:
+        sys.exit(0 if asyncio.run(check_indexes()) else 1)
+    if args.rebuild_rollups:
+        asyncio.run(rebuild_rollups(args.batch_size))
+        sys.exit(0)
+    if args.reevaluate_badges:
+        asyncio.run(badge_engine.reevaluate(batch_size=args.batch_size))
+        sys.exit(0)
+    parser.print_help()
@@ -0,0 +1,179 @@
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Runs backend/server.py on a freshly seeded database for load testing.
+# Against a local mongod (--mongo-url) the benchmark database is dropped and
+# rebuilt on every start; without one, mongomock_motor stands in for Mongo in
+# process. The stand-in lacks $geoNear, $geoWithin and $substrCP, so the routes
+# in STAND_IN_UNSUPPORTED fail there (loadtest.py skips them), and its timings
+# say nothing about Mongo.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "bench-admin@example.com"
+AD_PLACEMENTS = ["header", "sidebar", "footer"]
+STAND_IN_UNSUPPORTED = {"GET /islands/nearest", "GET /islands/viewport", "GET /blog?view=summary"}
+
+ATOLLS = {
+    # name: (lat, lng) of the atoll's centre
+    "Haa Alifu": (6.95, 72.95), "Haa Dhaalu": (6.65, 73.05), "Shaviyani": (6.30, 73.20),
+    "Noonu": (5.85, 73.35), "Raa": (5.55, 72.95), "Baa": (5.15, 73.05), "Lhaviyani": (5.35, 73.50),
+    "Kaafu": (4.30, 73.50), "Alifu Alifu": (4.05, 72.90), "Alifu Dhaalu": (3.65, 72.85),
+    "Vaavu": (3.45, 73.55), "Meemu": (3.00, 73.50), "Faafu": (3.20, 72.95), "Dhaalu": (2.80, 72.90),
+    "Thaa": (2.35, 73.05), "Laamu": (1.90, 73.40), "Gaafu Alifu": (0.60, 73.35),
+    "Gaafu Dhaalu": (0.25, 73.25), "Gnaviyani": (-0.30, 73.43), "Seenu": (-0.65, 73.15),
+}
+ISLAND_TYPES = ["inhabited", "resort", "uninhabited", "industrial"]
+TAGS = ["diving", "surfing", "snorkeling", "sandbank", "lagoon", "harbour", "mosque", "reef", "turtles", "mangroves"]
+WORDS = ("lagoon reef island atoll harbour dhoni tide coral sandbar jetty mosque market "
+         "turtle manta monsoon ferry lantern breadfruit palm").split()
+
+def bench_user_email(n):
+    return f"bench-user-{n}@example.com"
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def synthetic_islands(rng, count):
+    atolls = list(ATOLLS)
+    for n in range(count):
+        atoll = atolls[n % len(atolls)]
+        lat, lng = ATOLLS[atoll]
+        featured = n % 100 == 0
+        yield {
+            "name": f"{rng.choice(WORDS).capitalize()}{rng.choice(WORDS)} {n}",
+            "atoll": atoll,
+            "lat": round(lat + rng.uniform(-0.25, 0.25), 5),
+            "lng": round(lng + rng.uniform(-0.2, 0.2), 5),
+            "type": rng.choices(ISLAND_TYPES, weights=[5, 3, 6, 1])[0],
+            "population": rng.randint(50, 20000) if n % 3 == 0 else None,
+            "description": sentence(rng, 25),
+            "tags": rng.sample(TAGS, rng.randint(0, 3)),
+            "is_featured": featured,
+            "featured_order": n // 100 if featured else None,
+            "photos": [
+                {"url": f"https://example.com/islands/{n}/{p}.jpg", "caption": sentence(rng, 4)}
+                for p in range(rng.randint(0, 3))
+            ],
+        }
+
+async def seed_database(server, args):
+    rng = random.Random(args.seed)
+    db = server.db
+    now = datetime.utcnow()
+
+    islands = [server.Island(**island) for island in synthetic_islands(rng, args.islands)]
+    await db[server.ISLANDS_COLLECTION].insert_many([island.document() for island in islands])
+
+    # One bcrypt hash shared by every account keeps seeding fast
+    hashed_password = server.get_password_hash(BENCH_PASSWORD)
+    users = [
+        server.UserInDB(email=bench_user_email(n), username=f"bench{n}", hashed_password=hashed_password)
+        for n in range(args.users)
+    ]
+    admin = server.UserInDB(email=ADMIN_EMAIL, username="bench-admin", hashed_password=hashed_password, is_admin=True)
+
+    # Popularity is skewed: a few islands and travellers get most visits
+    island_weights = [1 / (rank + 1) for rank in range(len(islands))]
+    user_weights = [1 / (rank + 1) ** 0.5 for rank in range(len(users))]
+    visits = []
+    for _ in range(args.visits if users else 0):
+        user = rng.choices(users, weights=user_weights)[0]
+        island = rng.choices(islands, weights=island_weights)[0]
+        user.visits_count += 1
+        visits.append(server.Visit(
+            user_id=user.id,
+            island_id=island.id,
+            visit_date=now - timedelta(days=rng.uniform(0, 365)),
+            notes=sentence(rng, 8) if rng.random() < 0.3 else None,
+        ).model_dump())
+    await db[server.USERS_COLLECTION].insert_many([user.model_dump() for user in [admin, *users]])
+    for start in range(0, len(visits), 5000):
+        await db[server.VISITS_COLLECTION].insert_many(visits[start:start + 5000])
+
+    posts = []
+    for n in range(args.posts):
+        featured = n % 10 == 0
+        posts.append(server.BlogPost(
+            title=sentence(rng, 5).rstrip("."),
+            slug=f"bench-post-{n}",
+            content="".join(f"<p>{sentence(rng, 40)}</p>" for _ in range(rng.randint(5, 15))),
+            tags=rng.sample(TAGS, 2),
+            is_published=n % 8 != 0,
+            is_featured=featured,
+            featured_order=n // 10 if featured else None,
+            published_date=now - timedelta(days=n),
+            author_id=admin.id,
+        ).model_dump())
+    if posts:
+        await db[server.BLOG_POSTS_COLLECTION].insert_many(posts)
+
+    ads = [
+        server.Ad(
+            name=f"Bench ad {n}",
+            placement=AD_PLACEMENTS[n % len(AD_PLACEMENTS)],
+            destination_url=f"https://example.com/ads/{n}",
+            image_url=f"https://example.com/ads/{n}.png",
+            size="728x90",
+            weight=rng.randint(1, 5),
+            frequency_cap=3 if n % 4 == 0 else None,
+        ).model_dump()
+        for n in range(args.ads)
+    ]
+    if ads:
+        await db[server.ADS_COLLECTION].insert_many(ads)
+
+    await server.rebuild_rollups()
+    print(f"Seeded {len(islands)} islands, {len(users)} users, {len(visits)} visits, "
+          f"{len(posts)} posts, {len(ads)} ads", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API on a freshly seeded benchmark database")
+    parser.add_argument("--mongo-url", help="local mongod to use; omit for the in-process stand-in")
+    parser.add_argument("--db-name", default="islandlogger_bench")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--islands", type=int, default=1200)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--visits", type=int, default=50000)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--ads", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # The database is dropped on start, so refuse anything that isn't ours
+    if "bench" not in args.db_name:
+        parser.error("--db-name must contain 'bench'; the database is dropped on start")
+    os.environ["MONGO_URL"] = args.mongo_url or "mongodb://localhost:27017"
+    os.environ["DB_NAME"] = args.db_name
+
+    import uvicorn
+    import server
+
+    if args.mongo_url is None:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            parser.error("without --mongo-url the in-process stand-in needs `pip install mongomock-motor`")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[args.db_name]
+
+    async def seed():
+        await server.client.drop_database(args.db_name)
+        await seed_database(server, args)
+
+    async def award_badges():
+        # Starter badges are created by the app's own startup
+        await server.badge_engine.reevaluate()
+
+    # Seeding runs before the app's startup (indexes, catalogs, leaderboards)
+    server.app.router.on_startup.insert(0, seed)
+    server.app.router.on_startup.append(award_badges)
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import argparse
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from bench_server import ADMIN_EMAIL, AD_PLACEMENTS, BENCH_PASSWORD, STAND_IN_UNSUPPORTED, bench_user_email
+from login_storm import summarize
+
+# Closed-loop load test. Starts bench_server.py (or targets --base-url), then
+# drives each traffic mix for --duration seconds with --concurrency clients
+# and reports requests/s and latency percentiles per route as JSON. Routes are
+# labelled by template ("GET /islands/{id}") so runs can be compared with
+# --compare BASE.json HEAD.json. Against the in-process stand-in, routes it
+# cannot serve are left out of the mixes and listed as skipped.
+
+def request(label, method, path, params=None, json_body=None, auth=None):
+    return {"label": label, "method": method, "path": path, "params": params, "json": json_body, "auth": auth}
+
+def homepage(ctx, rng):
+    return rng.choices([
+        lambda: request("GET /featured/islands", "GET", "/featured/islands"),
+        lambda: request("GET /featured/articles", "GET", "/featured/articles"),
+        lambda: request("GET /ads/select", "GET", "/ads/select",
+                        {"placement": rng.choice(AD_PLACEMENTS), "visitor_id": f"v{rng.randrange(10000)}"}),
+        lambda: request("GET /blog?view=summary", "GET", "/blog", {"view": "summary", "limit": 6}),
+        lambda: request("GET /blog/{slug}", "GET", f"/blog/{rng.choice(ctx['slugs'])}"),
+    ], weights=[3, 3, 2, 2, 1])[0]()
+
+def map_view(ctx, rng):
+    island = rng.choice(ctx["islands"])
+    span = rng.uniform(0.2, 3)
+    return rng.choices([
+        lambda: request("GET /islands", "GET", "/islands"),
+        lambda: request("GET /islands?atoll=&type=", "GET", "/islands", {"atoll": island["atoll"], "type": island["type"]}),
+        lambda: request("GET /islands?q=", "GET", "/islands", {"q": island["name"][:3], "limit": 20}),
+        lambda: request("GET /islands/viewport", "GET", "/islands/viewport", {
+            "min_lat": island["lat"] - span, "max_lat": island["lat"] + span,
+            "min_lng": island["lng"] - span, "max_lng": island["lng"] + span,
+            "zoom": rng.randint(5, 12),
+        }),
+        lambda: request("GET /islands/{id}", "GET", f"/islands/{island['id']}"),
+        lambda: request("GET /islands/nearest", "GET", "/islands/nearest", {"lat": island["lat"], "lng": island["lng"], "k": 5}),
+    ], weights=[3, 2, 1, 3, 2, 1])[0]()
+
+def dashboard(ctx, rng):
+    auth = rng.choice(ctx["user_tokens"])
+    island = rng.choice(ctx["islands"])
+    return rng.choices([
+        lambda: request("GET /users/me", "GET", "/users/me", auth=auth),
+        lambda: request("GET /islands/visited", "GET", "/islands/visited", auth=auth),
+        lambda: request("GET /visits/user", "GET", "/visits/user", {"limit": 50}, auth=auth),
+        lambda: request("GET /badges/me", "GET", "/badges/me", auth=auth),
+        lambda: request("GET /leaderboards/{metric}/me", "GET", f"/leaderboards/{rng.choice(['visits', 'islands', 'atolls'])}/me", auth=auth),
+        lambda: request("GET /leaderboards/{metric}", "GET", "/leaderboards/visits", {"limit": 10}),
+        lambda: request("POST /visits", "POST", "/visits",
+                        json_body={"island_id": island["id"], "visit_date": datetime.utcnow().isoformat()}, auth=auth),
+    ], weights=[2, 2, 2, 1, 1, 1, 1])[0]()
+
+def admin(ctx, rng):
+    auth = ctx["admin_token"]
+    time_range = rng.choice(["week", "month", "year"])
+    return rng.choices([
+        lambda: request("GET /admin/analytics/visits-per-day", "GET", "/admin/analytics/visits-per-day", {"range": time_range}, auth=auth),
+        lambda: request("GET /admin/analytics/top-islands", "GET", "/admin/analytics/top-islands", {"range": time_range}, auth=auth),
+        lambda: request("GET /admin/analytics/top-atolls", "GET", "/admin/analytics/top-atolls", {"range": time_range}, auth=auth),
+        lambda: request("GET /admin/analytics/user-growth", "GET", "/admin/analytics/user-growth", {"range": time_range}, auth=auth),
+        lambda: request("GET /admin/users", "GET", "/admin/users", {"limit": 50}, auth=auth),
+        lambda: request("GET /admin/ads/stats", "GET", "/admin/ads/stats", auth=auth),
+        lambda: request("GET /blog?published_only=false", "GET", "/blog", {"published_only": "false", "limit": 20}),
+    ], weights=[2, 2, 1, 1, 1, 1, 1])[0]()
+
+MIXES = {"homepage": homepage, "map": map_view, "dashboard": dashboard, "admin": admin}
+
+def login(base_url, email):
+    response = requests.post(f"{base_url}/login", data={"username": email, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def prepare(base_url, users):
+    islands = requests.get(f"{base_url}/islands").json()
+    posts = requests.get(f"{base_url}/blog", params={"limit": 100}).json()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        user_tokens = list(pool.map(lambda n: login(base_url, bench_user_email(n)), range(users)))
+    return {
+        "islands": islands,
+        "slugs": [post["slug"] for post in posts] or ["missing"],
+        "user_tokens": user_tokens,
+        "admin_token": login(base_url, ADMIN_EMAIL),
+    }
+
+def run_mix(base_url, ctx, mix, concurrency, duration, warmup, seed, skip=frozenset()):
+    samples = {}
+    skipped = set()
+    lock = threading.Lock()
+    measure_from = time.monotonic() + warmup
+    deadline = measure_from + duration
+
+    def worker(worker_id):
+        rng = random.Random(f"{seed}:{mix}:{worker_id}")
+        session = requests.Session()
+        local = {}
+        local_skipped = set()
+        while time.monotonic() < deadline:
+            spec = MIXES[mix](ctx, rng)
+            if spec["label"] in skip:
+                local_skipped.add(spec["label"])
+                continue
+            headers = {"Authorization": f"Bearer {spec['auth']}"} if spec["auth"] else None
+            started = time.perf_counter()
+            try:
+                response = session.request(spec["method"], f"{base_url}{spec['path']}", params=spec["params"],
+                                           json=spec["json"], headers=headers, timeout=30)
+                ok = response.status_code < 400
+                failed = response.status_code >= 500
+            except requests.RequestException:
+                ok, failed = False, True
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if failed:
+                # uvicorn closes the connection after an unhandled error; start
+                # afresh so the next request isn't charged for it
+                session.close()
+                session = requests.Session()
+            if time.monotonic() >= measure_from:
+                latencies, errors = local.setdefault(spec["label"], ([], [0]))
+                latencies.append(elapsed_ms)
+                errors[0] += not ok
+        with lock:
+            skipped.update(local_skipped)
+            for label, (latencies, errors) in local.items():
+                merged = samples.setdefault(label, ([], [0]))
+                merged[0].extend(latencies)
+                merged[1][0] += errors[0]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+
+    routes = {
+        label: {**summarize(latencies), "errors": errors[0], "rps": round(len(latencies) / duration, 2)}
+        for label, (latencies, errors) in sorted(samples.items())
+    }
+    total = sum(route["count"] for route in routes.values())
+    return {
+        "requests": total,
+        "rps": round(total / duration, 2),
+        "errors": sum(route["errors"] for route in routes.values()),
+        "routes": routes,
+        "skipped": sorted(skipped),
+    }
+
+def wait_until_ready(base_url, server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            sys.exit(f"bench_server.py exited with {server.returncode}")
+        try:
+            if requests.get(f"{base_url}/featured/islands", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    sys.exit(f"{base_url} not ready after {timeout}s")
+
+def compare(base_path, head_path):
+    base, head = json.loads(Path(base_path).read_text()), json.loads(Path(head_path).read_text())
+    print(f"{'mix / route':58} {'rps':^18}{'p95 ms':^20}{'p99 ms':^20}")
+    for mix, head_mix in head["mixes"].items():
+        base_routes = base["mixes"].get(mix, {}).get("routes", {})
+        for label, route in head_mix["routes"].items():
+            old = base_routes.get(label)
+            if old is None:
+                continue
+            print(f"{mix + ' ' + label:58} "
+                  f"{old['rps']:>8.1f}->{route['rps']:<8.1f}"
+                  f"{old['p95_ms']:>9.1f}->{route['p95_ms']:<9.1f}"
+                  f"{old['p99_ms']:>9.1f}->{route['p99_ms']:<9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-route throughput and latency under realistic traffic mixes")
+    parser.add_argument("--base-url", help="target an already running API instead of starting bench_server.py")
+    parser.add_argument("--mongo-url", help="local mongod for bench_server.py; omit for the in-process stand-in")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--mix", default="homepage,map,dashboard,admin",
+                        help=f"comma-separated, from: {', '.join(MIXES)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds per mix")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unmeasured seconds before each mix")
+    parser.add_argument("--logins", type=int, default=20, help="seeded travellers the dashboard mix signs in as")
+    parser.add_argument("--islands", type=int, default=1200)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--visits", type=int, default=50000)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--ads", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="diff two reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    mixes = args.mix.split(",")
+    unknown = set(mixes) - set(MIXES)
+    if unknown:
+        parser.error(f"unknown mix: {', '.join(sorted(unknown))}")
+
+    server = None
+    base_url = args.base_url
+    stand_in = base_url is None and args.mongo_url is None
+    skip = STAND_IN_UNSUPPORTED if stand_in else frozenset()
+    if base_url is None:
+        base_url = f"http://127.0.0.1:{args.port}/api"
+        command = [sys.executable, str(Path(__file__).with_name("bench_server.py")), "--port", str(args.port),
+                   "--islands", str(args.islands), "--users", str(args.users), "--visits", str(args.visits),
+                   "--posts", str(args.posts), "--ads", str(args.ads), "--seed", str(args.seed)]
+        if args.mongo_url:
+            command += ["--mongo-url", args.mongo_url]
+        server = subprocess.Popen(command)
+    try:
+        wait_until_ready(base_url, server, args.ready_timeout)
+        ctx = prepare(base_url, min(args.logins, args.users))
+        report = {
+            "config": {
+                "started_at": datetime.utcnow().isoformat(),
+                "base_url": base_url,
+                "mongo": "in-process stand-in" if stand_in else ("external" if args.base_url else "mongod"),
+                "concurrency": args.concurrency,
+                "duration_s": args.duration,
+                "seed": args.seed,
+                "data": {"islands": args.islands, "users": args.users, "visits": args.visits,
+                         "posts": args.posts, "ads": args.ads},
+            },
+            "mixes": {
+                mix: run_mix(base_url, ctx, mix, args.concurrency, args.duration, args.warmup, args.seed, skip)
+                for mix in mixes
+            },
+        }
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import json
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Measures how a burst of logins affects unrelated endpoints. A probe thread
+# polls a cheap public route while a pool of clients hammers /login; with
+# bcrypt on the event loop the probe's p99 tracks the bcrypt cost, with the
+# bounded hashing executor it should stay close to the idle baseline.
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "p99_ms": percentile(samples, 99),
+        "max_ms": max(samples) if samples else None,
+        "mean_ms": statistics.mean(samples) if samples else None,
+    }
+
+def probe(base_url, path, stop, samples):
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        session.get(f"{base_url}{path}")
+        samples.append((time.perf_counter() - started) * 1000)
+
+def measure_probe(base_url, path, duration):
+    samples = []
+    stop = threading.Event()
+    thread = threading.Thread(target=probe, args=(base_url, path, stop, samples))
+    thread.start()
+    time.sleep(duration)
+    stop.set()
+    thread.join()
+    return samples
+
+def login_storm(base_url, credentials, clients, duration):
+    deadline = time.monotonic() + duration
+    latencies = []
+    statuses = {}
+
+    def worker():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = session.post(f"{base_url}/login", data=credentials)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(worker)
+    return latencies, statuses
+
+def main():
+    parser = argparse.ArgumentParser(description="p99 of an unrelated endpoint during a login storm")
+    parser.add_argument("--base-url", default="http://localhost:8001/api")
+    parser.add_argument("--probe-path", default="/featured/islands")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    # Throwaway account so the storm exercises real bcrypt verification
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    password = "bench-password"
+    requests.post(f"{args.base_url}/register", json={"email": email, "username": email, "password": password})
+    credentials = {"username": email, "password": password}
+
+    baseline = measure_probe(args.base_url, args.probe_path, args.duration / 2)
+
+    storm_samples = []
+    stop = threading.Event()
+    thread = threading.Thread(target=probe, args=(args.base_url, args.probe_path, stop, storm_samples))
+    thread.start()
+    login_latencies, statuses = login_storm(args.base_url, credentials, args.clients, args.duration)
+    stop.set()
+    thread.join()
+
+    print(json.dumps({
+        "probe_path": args.probe_path,
+        "clients": args.clients,
+        "baseline": summarize(baseline),
+        "during_storm": summarize(storm_samples),
+        "logins": {**summarize(login_latencies), "statuses": statuses},
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
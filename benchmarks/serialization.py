@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+# Per-item cost of rendering /islands and /blog bodies, in-process and without
+# Mongo. "legacy" is what FastAPI does with a response_model (build models,
+# re-validate them, jsonable_encoder, json.dumps); "fast" is the json_response
+# path the routes use now (validate once, pydantic-core straight to bytes).
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "islandlogger_bench")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import server
+from server import BlogPost, Island
+
+def island_docs(count):
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Island {i}",
+            "atoll": f"Atoll {i % 20}",
+            "lat": 4.0 + i * 0.001,
+            "lng": 73.0 + i * 0.001,
+            "type": ["local", "resort", "uninhabited"][i % 3],
+            "population": 1000 + i,
+            "description": "A small island with a harbour and a long sandbar. " * 3,
+            "tags": ["diving", "surfing", "sandbank"][: i % 3 + 1],
+            "is_featured": i % 10 == 0,
+            "photos": [{"url": f"https://example.com/{i}.jpg", "caption": "Beach"}],
+            "created_at": datetime(2024, 1, 1) + timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+def blog_docs(count):
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Post {i}",
+            "slug": f"post-{i}",
+            "content": "<p>" + "Lorem ipsum dolor sit amet. " * 200 + "</p>",
+            "excerpt": "Lorem ipsum dolor sit amet.",
+            "tags": ["travel", "diving"],
+            "is_published": True,
+            "published_date": datetime(2024, 1, 1) + timedelta(hours=i),
+            "author_id": "author",
+        }
+        for i in range(count)
+    ]
+
+def legacy_islands(docs, field):
+    # The catalog already holds models, so only the response_model pass is counted
+    models = [Island(**doc) for doc in docs]
+    return lambda: JSONResponse(asyncio.run(serialize_response(field=field, response_content=models, is_coroutine=True))).body
+
+def legacy_blog(docs, field):
+    async def render():
+        return await serialize_response(field=field, response_content=[BlogPost(**doc) for doc in docs], is_coroutine=True)
+    return lambda: JSONResponse(asyncio.run(render())).body
+
+def fast_islands(docs):
+    models = [Island(**doc) for doc in docs]
+    return lambda: server.json_response(server.island_list_adapter, models).body
+
+def fast_blog(docs):
+    return lambda: server.json_response(server.blog_post_list_adapter, [BlogPost(**doc) for doc in docs]).body
+
+def per_item_us(render, items, repeat):
+    render()  # warm up
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best / items * 1_000_000, 2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-item serialization cost for /islands and /blog")
+    parser.add_argument("--islands", type=int, default=500)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    islands = island_docs(args.islands)
+    posts = blog_docs(args.posts)
+    island_field = create_response_field(name="Response_get_islands", type_=List[Island], mode="serialization")
+    blog_field = create_response_field(name="Response_get_blog_posts", type_=List[BlogPost], mode="serialization")
+
+    results = {}
+    for route, items, legacy, fast in [
+        ("/islands", args.islands, legacy_islands(islands, island_field), fast_islands(islands)),
+        ("/blog", args.posts, legacy_blog(posts, blog_field), fast_blog(posts)),
+    ]:
+        legacy_us = per_item_us(legacy, items, args.repeat)
+        fast_us = per_item_us(fast, items, args.repeat)
+        results[route] = {
+            "items": items,
+            "legacy_us_per_item": legacy_us,
+            "fast_us_per_item": fast_us,
+            "speedup": round(legacy_us / fast_us, 2) if fast_us else None,
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -21,7 +21,7 @@ export default function Blog() {
       setLoading(true);
       
       // Construct URL based on whether a tag is selected
-      let url = `${API}/blog?limit=20`;
+      let url = `${API}/blog?limit=20&view=summary`;
       if (selectedTag) {
         url += `&tag=${selectedTag}`;
       }
@@ -62,7 +62,7 @@ export default function Blog() {
     if (post.excerpt) return post.excerpt;
     
     // Strip HTML tags and truncate to 150 chars
-    const strippedContent = post.content.replace(/<[^>]*>?/gm, '');
+    const strippedContent = (post.content || '').replace(/<[^>]*>?/gm, '');
     return strippedContent.length > 150 
       ? strippedContent.substring(0, 150) + '...'
       : strippedContent;
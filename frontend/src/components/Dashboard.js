@@ -5,11 +5,13 @@ import { useAuth } from '../context/AuthContext';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const RECENT_VISITS = 5;
 
 export default function Dashboard() {
   const { user } = useAuth();
   const [visitedIslands, setVisitedIslands] = useState([]);
   const [visits, setVisits] = useState([]);
+  const [badges, setBadges] = useState([]);
   const [loading, setLoading] = useState(true);
   const [stats, setStats] = useState({
     totalVisits: 0,
@@ -34,16 +36,25 @@ export default function Dashboard() {
         headers: { Authorization: `Bearer ${token}` }
       });
       
-      // Fetch user's visits
+      // Fetch only the recent visits shown below; counts come with the islands
       const visitsResponse = await axios.get(`${API}/visits/user`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { limit: RECENT_VISITS }
+      });
+      
+      // Badges are awarded by the server; progress comes with them
+      const badgesResponse = await axios.get(`${API}/badges/me`, {
         headers: { Authorization: `Bearer ${token}` }
       });
       
       const islands = islandsResponse.data;
-      const userVisits = visitsResponse.data;
       
       setVisitedIslands(islands);
-      setVisits(userVisits);
+      setVisits(visitsResponse.data);
+      setBadges(badgesResponse.data.map(badge => ({
+        ...badge,
+        progress: Math.min(100, (badge.count / badge.target) * 100)
+      })));
       
       // Calculate stats
       const uniqueIslandIds = new Set(islands.map(island => island.id));
@@ -56,7 +67,7 @@ export default function Dashboard() {
       }, {});
       
       setStats({
-        totalVisits: userVisits.length,
+        totalVisits: islands.reduce((total, island) => total + island.visit_count, 0),
         uniqueIslands: uniqueIslandIds.size,
         atolls: atolls,
         types: typeCount
@@ -69,90 +80,6 @@ export default function Dashboard() {
     }
   };
   
-  // Calculate badges
-  const calculateBadges = () => {
-    const badges = [];
-    
-    // Islands visited badges
-    if (stats.uniqueIslands >= 10) {
-      badges.push({
-        name: "Island Explorer",
-        description: "Visited 10+ islands",
-        icon: "🏝️",
-        earned: true
-      });
-    } else {
-      badges.push({
-        name: "Island Explorer",
-        description: "Visit 10+ islands",
-        icon: "🏝️",
-        earned: false,
-        progress: (stats.uniqueIslands / 10) * 100
-      });
-    }
-    
-    // Resort explorer
-    const resortsVisited = stats.types.resort || 0;
-    if (resortsVisited >= 5) {
-      badges.push({
-        name: "Resort Connoisseur",
-        description: "Visited 5+ resort islands",
-        icon: "🏖️",
-        earned: true
-      });
-    } else {
-      badges.push({
-        name: "Resort Connoisseur",
-        description: "Visit 5+ resort islands",
-        icon: "🏖️",
-        earned: false,
-        progress: (resortsVisited / 5) * 100
-      });
-    }
-    
-    // Local explorer
-    const localIslandsVisited = stats.types.inhabited || 0;
-    if (localIslandsVisited >= 5) {
-      badges.push({
-        name: "Local Explorer",
-        description: "Visited 5+ inhabited islands",
-        icon: "🏘️",
-        earned: true
-      });
-    } else {
-      badges.push({
-        name: "Local Explorer",
-        description: "Visit 5+ inhabited islands",
-        icon: "🏘️",
-        earned: false,
-        progress: (localIslandsVisited / 5) * 100
-      });
-    }
-    
-    // Atoll badges
-    const atollCount = stats.atolls.size;
-    if (atollCount >= 3) {
-      badges.push({
-        name: "Atoll Hopper",
-        description: "Visited islands in 3+ different atolls",
-        icon: "🧭",
-        earned: true
-      });
-    } else {
-      badges.push({
-        name: "Atoll Hopper",
-        description: "Visit islands in 3+ different atolls",
-        icon: "🧭",
-        earned: false,
-        progress: (atollCount / 3) * 100
-      });
-    }
-    
-    return badges;
-  };
-  
-  const badges = calculateBadges();
-  
   if (loading) {
     return (
       <div className="flex items-center justify-center h-screen">
@@ -260,9 +187,9 @@ export default function Dashboard() {
                       </span>
                       
                       {/* Count of visits to this island */}
-                      {visits.filter(v => v.island_id === island.id).length > 1 && (
+                      {island.visit_count > 1 && (
                         <span className="text-xs bg-purple-100 text-purple-800 px-2 py-1 rounded-full">
-                          {visits.filter(v => v.island_id === island.id).length} visits
+                          {island.visit_count} visits
                         </span>
                       )}
                     </div>
@@ -285,7 +212,7 @@ export default function Dashboard() {
             <p className="text-center py-4 text-gray-500">No visits recorded yet.</p>
           ) : (
             <div className="space-y-4">
-              {visits.slice(0, 5).map(visit => {
+              {visits.map(visit => {
                 const island = visitedIslands.find(i => i.id === visit.island_id);
                 return (
                   <div key={visit.id} className="border-b border-gray-100 pb-4 last:border-0">
@@ -316,10 +243,10 @@ export default function Dashboard() {
                 );
               })}
               
-              {visits.length > 5 && (
+              {stats.totalVisits > visits.length && (
                 <div className="text-center pt-2">
                   <button className="text-sm text-blue-600 hover:text-blue-800">
-                    View all {visits.length} visits
+                    View all {stats.totalVisits} visits
                   </button>
                 </div>
               )}
@@ -48,11 +48,11 @@ export default function IslandDetails() {
       const response = await axios.get(`${API}/visits/user`, {
         headers: {
           Authorization: `Bearer ${token}`
-        }
+        },
+        params: { island_id: id }
       });
       
-      const visits = response.data;
-      const islandVisits = visits.filter(visit => visit.island_id === id);
+      const islandVisits = response.data;
       
       setUserVisits(islandVisits);
       setIsVisited(islandVisits.length > 0);
@@ -10,6 +10,7 @@ export default function IslandList() {
   const { user } = useAuth();
   const [islands, setIslands] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [hasLoaded, setHasLoaded] = useState(false);
   const [error, setError] = useState(null);
   const [visitedIslands, setVisitedIslands] = useState([]);
   const [filterType, setFilterType] = useState('all');
@@ -18,26 +19,60 @@ export default function IslandList() {
   const [atolls, setAtolls] = useState([]);
   const [currentPage, setCurrentPage] = useState(1);
   const [islandsPerPage] = useState(12);
+  const [totalIslands, setTotalIslands] = useState(0);
+  // pageCursors[i] is the cursor that loads page i + 1 (page 1 needs none)
+  const [pageCursors, setPageCursors] = useState([null]);
   
   useEffect(() => {
-    fetchIslands();
+    fetchAtolls();
   }, []);
   
   useEffect(() => {
     if (user) {
       fetchVisitedIslands();
     }
-    
-    // Extract unique atolls from islands
-    const uniqueAtolls = [...new Set(islands.map(island => island.atoll))].sort();
-    setAtolls(uniqueAtolls);
-  }, [user, islands]);
+  }, [user]);
+  
+  // Filters reset pagination; the search box is debounced so typing does
+  // not fire a request per keystroke
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      setPageCursors([null]);
+      fetchIslands(1, null);
+    }, searchQuery ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [filterType, filterAtoll, searchQuery]);
   
-  const fetchIslands = async () => {
+  const fetchAtolls = async () => {
+    try {
+      const response = await axios.get(`${API}/islands/atolls`);
+      setAtolls(response.data.map(entry => entry.atoll));
+    } catch (err) {
+      console.error("Error fetching atolls:", err);
+    }
+  };
+  
+  const fetchIslands = async (page, cursor) => {
     try {
       setLoading(true);
-      const response = await axios.get(`${API}/islands`);
+      const params = { limit: islandsPerPage, type: filterType, atoll: filterAtoll };
+      if (searchQuery) params.q = searchQuery;
+      if (cursor) params.cursor = cursor;
+      
+      const response = await axios.get(`${API}/islands`, { params });
       setIslands(response.data);
+      setCurrentPage(page);
+      setTotalIslands(parseInt(response.headers['x-total-count'], 10) || response.data.length);
+      
+      const nextCursor = response.headers['x-next-cursor'];
+      if (nextCursor) {
+        setPageCursors(prev => {
+          const cursors = prev.slice(0, page);
+          cursors[page] = nextCursor;
+          return cursors;
+        });
+      }
+      setHasLoaded(true);
       setLoading(false);
     } catch (err) {
       console.error("Error fetching islands:", err);
@@ -67,32 +102,19 @@ export default function IslandList() {
     }
   };
   
-  const filteredIslands = islands.filter(island => {
-    // Type filter
-    const matchesType = filterType === 'all' || island.type === filterType;
-    
-    // Atoll filter
-    const matchesAtoll = filterAtoll === 'all' || island.atoll === filterAtoll;
-    
-    // Search query
-    const matchesSearch = searchQuery === '' || 
-      island.name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      island.atoll.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      (island.tags && island.tags.some(tag => tag.toLowerCase().includes(searchQuery.toLowerCase())));
-    
-    return matchesType && matchesAtoll && matchesSearch;
-  });
-  
-  // Get current islands for pagination
-  const indexOfLastIsland = currentPage * islandsPerPage;
-  const indexOfFirstIsland = indexOfLastIsland - islandsPerPage;
-  const currentIslands = filteredIslands.slice(indexOfFirstIsland, indexOfLastIsland);
+  // Filtering and pagination happen server-side, so the current page is
+  // exactly what the API returned
+  const currentIslands = islands;
   
-  // Change page
-  const paginate = pageNumber => setCurrentPage(pageNumber);
+  // Change page; only pages whose cursor is already known are reachable
+  const paginate = pageNumber => {
+    if (pageNumber === 1 || pageCursors[pageNumber - 1]) {
+      fetchIslands(pageNumber, pageCursors[pageNumber - 1]);
+    }
+  };
   
   // Total pages
-  const totalPages = Math.ceil(filteredIslands.length / islandsPerPage);
+  const totalPages = Math.ceil(totalIslands / islandsPerPage);
   
   // Get type color based on island type
   const getTypeColor = (type) => {
@@ -109,14 +131,18 @@ export default function IslandList() {
   const renderPaginationButtons = () => {
     const buttons = [];
     for (let i = 1; i <= totalPages; i++) {
+      const reachable = i === 1 || Boolean(pageCursors[i - 1]);
       buttons.push(
         <button
           key={i}
           onClick={() => paginate(i)}
+          disabled={!reachable}
           className={`px-3 py-1 mx-1 rounded-md ${
             currentPage === i
               ? 'bg-blue-500 text-white'
-              : 'bg-gray-200 text-gray-700 hover:bg-gray-300'
+              : reachable
+                ? 'bg-gray-200 text-gray-700 hover:bg-gray-300'
+                : 'bg-gray-100 text-gray-400'
           }`}
         >
           {i}
@@ -219,7 +245,7 @@ export default function IslandList() {
     return cards;
   };
   
-  if (loading) {
+  if (loading && !hasLoaded) {
     return (
       <div className="flex items-center justify-center h-screen">
         <div className="animate-spin rounded-full h-12 w-12 border-t-2 border-b-2 border-blue-500"></div>
@@ -284,9 +310,7 @@ export default function IslandList() {
           {/* Results counter */}
           <div className="flex items-end">
             <p className="text-sm text-gray-500">
-              Showing {currentIslands.length} of {filteredIslands.length} islands
-              {filteredIslands.length !== islands.length && 
-                ` (filtered from ${islands.length} total)`}
+              Showing {currentIslands.length} of {totalIslands} islands
             </p>
           </div>
         </div>
@@ -32,8 +32,9 @@ export default function AdminHome() {
       // Here we'll gather stats from various endpoints
       const [usersRes, islandsRes, blogRes] = await Promise.all([
         axios.get(`${API}/admin/users?limit=1000`, { headers }),
-        axios.get(`${API}/islands`),
-        axios.get(`${API}/blog?limit=1000`)
+        // Only the totals are needed, which come back in X-Total-Count
+        axios.get(`${API}/islands?limit=1`),
+        axios.get(`${API}/blog?limit=1&view=summary`)
       ]);
       
       // Count visits (in a real app, this would be a dedicated endpoint)
@@ -44,9 +45,9 @@ export default function AdminHome() {
       
       setStats({
         users: usersRes.data.length,
-        islands: islandsRes.data.length,
+        islands: parseInt(islandsRes.headers['x-total-count'], 10) || 0,
         visits: totalVisits,
-        blogPosts: blogRes.data.length
+        blogPosts: parseInt(blogRes.headers['x-total-count'], 10) || 0
       });
       
       setLoading(false);
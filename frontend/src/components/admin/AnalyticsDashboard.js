@@ -26,34 +26,28 @@ export default function AnalyticsDashboard() {
     try {
       setLoading(true);
       const token = localStorage.getItem('token');
+      const config = {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { range: timeRange }
+      };
       
-      // For demonstration purposes, we'll use the existing endpoints to gather analytics data
-      // Ideally, we'd have dedicated analytics endpoints
-      const [users, islands, visits] = await Promise.all([
-        axios.get(`${API}/admin/users`, { headers: { Authorization: `Bearer ${token}` } }),
-        axios.get(`${API}/islands`),
-        // Since we don't have a "get all visits" endpoint for admins, we'll use user visits
-        axios.get(`${API}/visits/user`, { headers: { Authorization: `Bearer ${token}` } })
+      // Every report is aggregated server-side, so only the summaries are transferred
+      const [visitsPerDay, topIslands, topAtolls, userGrowth] = await Promise.all([
+        axios.get(`${API}/admin/analytics/visits-per-day`, config),
+        axios.get(`${API}/admin/analytics/top-islands`, config),
+        axios.get(`${API}/admin/analytics/top-atolls`, config),
+        axios.get(`${API}/admin/analytics/user-growth`, config)
       ]);
       
-      // Artificial visit data for demo purposes
-      const dailyVisitData = generateDailyVisitData(30); // Generate 30 days of mock data
-      
-      // Calculate top islands
-      const islandVisits = calculateTopIslands(islands.data, visits.data);
-      
-      // Calculate top atolls
-      const atollVisits = calculateTopAtolls(islands.data);
-      
-      // Calculate user growth
-      const userGrowthData = generateUserGrowthData(users.data);
-      
       setAnalytics({
-        totalVisits: visits.data.length,
-        visitsPerDay: dailyVisitData,
-        topIslands: islandVisits,
-        userGrowth: userGrowthData,
-        topAtolls: atollVisits
+        totalVisits: visitsPerDay.data.total,
+        visitsPerDay: visitsPerDay.data.days,
+        topIslands: topIslands.data.islands,
+        userGrowth: userGrowth.data.periods.map(period => ({
+          month: period.period,
+          users: period.users
+        })),
+        topAtolls: topAtolls.data.atolls
       });
       
       setLoading(false);
@@ -64,79 +58,6 @@ export default function AnalyticsDashboard() {
     }
   };
   
-  // Generate mock data for daily visits
-  const generateDailyVisitData = (days) => {
-    const data = [];
-    const today = new Date();
-    for (let i = days - 1; i >= 0; i--) {
-      const date = new Date(today);
-      date.setDate(today.getDate() - i);
-      data.push({
-        date: date.toISOString().split('T')[0],
-        visits: Math.floor(Math.random() * 20) + 1 // Random number between 1-20
-      });
-    }
-    return data;
-  };
-  
-  // Calculate top visited islands
-  const calculateTopIslands = (islands, visits) => {
-    // Count visits per island
-    const islandVisitCount = {};
-    visits.forEach(visit => {
-      islandVisitCount[visit.island_id] = (islandVisitCount[visit.island_id] || 0) + 1;
-    });
-    
-    // Match with island details and sort
-    return islands
-      .map(island => ({
-        id: island.id,
-        name: island.name,
-        atoll: island.atoll,
-        type: island.type,
-        visits: islandVisitCount[island.id] || 0
-      }))
-      .sort((a, b) => b.visits - a.visits)
-      .slice(0, 5); // Top 5
-  };
-  
-  // Calculate top atolls
-  const calculateTopAtolls = (islands) => {
-    // Count islands per atoll and assign a random visit count for demonstration
-    const atollCounts = {};
-    islands.forEach(island => {
-      if (!atollCounts[island.atoll]) {
-        atollCounts[island.atoll] = {
-          name: island.atoll,
-          islands: 0,
-          visits: 0
-        };
-      }
-      atollCounts[island.atoll].islands += 1;
-      // For demo purposes, assign random visit counts
-      atollCounts[island.atoll].visits += Math.floor(Math.random() * 50);
-    });
-    
-    return Object.values(atollCounts)
-      .sort((a, b) => b.visits - a.visits)
-      .slice(0, 5); // Top 5
-  };
-  
-  // Generate mock user growth data
-  const generateUserGrowthData = (users) => {
-    // For demonstration purposes, distribute user registrations over past months
-    const monthlyGrowth = [
-      { month: 'Jan', users: Math.floor(users.length * 0.1) },
-      { month: 'Feb', users: Math.floor(users.length * 0.12) },
-      { month: 'Mar', users: Math.floor(users.length * 0.15) },
-      { month: 'Apr', users: Math.floor(users.length * 0.18) },
-      { month: 'May', users: users.length - Math.floor(users.length * 0.1) - Math.floor(users.length * 0.12) - 
-        Math.floor(users.length * 0.15) - Math.floor(users.length * 0.18) }
-    ];
-    
-    return monthlyGrowth;
-  };
-  
   if (loading) {
     return (
       <div className="flex justify-center items-center h-64">
@@ -246,7 +167,7 @@ export default function AnalyticsDashboard() {
                 <div 
                   className="w-full bg-blue-500 rounded-t"
                   style={{ 
-                    height: `${(day.visits / 20) * 100}%`,
+                    height: `${(day.visits / Math.max(1, ...analytics.visitsPerDay.map(d => d.visits))) * 100}%`,
                     maxHeight: '90%',
                     minHeight: '5%'
                   }}
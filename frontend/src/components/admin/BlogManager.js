@@ -22,7 +22,7 @@ export default function BlogManager() {
       setLoading(true);
       const token = localStorage.getItem('token');
       
-      const response = await axios.get(`${API}/blog?published_only=false`, {
+      const response = await axios.get(`${API}/blog?published_only=false&view=summary`, {
         headers: { Authorization: `Bearer ${token}` }
       });
       